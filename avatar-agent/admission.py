@@ -0,0 +1,103 @@
+"""
+Load reporting and job admission for the avatar worker
+Runs in the main worker process. Combines active sessions, host CPU and
+event-loop lag into one load figure for LiveKit, and rejects rooms past the
+limits so the server dispatches them to another worker.
+"""
+
+import asyncio
+import logging
+import os
+import threading
+import time
+
+import telemetry
+
+logger = logging.getLogger("ong-avatar-agent")
+
+LAG_SAMPLE_INTERVAL = 0.25
+# Weight of the newest lag sample in the moving average
+LAG_SMOOTHING = 0.2
+# An accepted room that never shows up in active_jobs (failed to launch, or ended between ticks) stops counting after this
+PENDING_TIMEOUT_SECONDS = 30.0
+
+
+class AdmissionController:
+    """max_sessions=0 (the default) leaves the session count uncapped; CPU and loop lag still apply"""
+
+    def __init__(self, max_sessions=0, cpu_threshold=0.8, lag_threshold_ms=250.0):
+        self.max_sessions = max_sessions
+        self.cpu_threshold = cpu_threshold
+        self.lag_threshold_ms = lag_threshold_ms
+        self.active_sessions = 0
+        self.cpu_load = 0.0
+        self.loop_lag_ms = 0.0
+        self.load = 0.0
+        # Accepted jobs not yet in active_jobs (job id -> accepted at), so a burst can't overshoot
+        self._pending = {}
+        self._pending_lock = threading.Lock()
+        self._lag_task = None
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            max_sessions=int(os.getenv("AVATAR_MAX_SESSIONS", "0")),
+            cpu_threshold=float(os.getenv("AVATAR_ADMISSION_CPU", "0.8")),
+            lag_threshold_ms=float(os.getenv("AVATAR_ADMISSION_LAG_MS", "250")),
+        )
+
+    def update(self, worker, cpu_load):
+        """Recompute load from the worker state; returns the value reported to LiveKit"""
+        active_ids = {job.job.id for job in worker.active_jobs}
+        self.active_sessions = len(active_ids)
+        now = time.monotonic()
+        with self._pending_lock:
+            for job_id, accepted_at in list(self._pending.items()):
+                if job_id in active_ids or now - accepted_at > PENDING_TIMEOUT_SECONDS:
+                    del self._pending[job_id]
+        self.cpu_load = cpu_load
+        self.load = max(
+            self.active_sessions / self.max_sessions if self.max_sessions > 0 else 0.0,
+            cpu_load / self.cpu_threshold * 0.9,
+            self.loop_lag_ms / self.lag_threshold_ms * 0.9,
+        )
+        return min(self.load, 1.0)
+
+    def ensure_lag_monitor(self):
+        if self._lag_task is None or self._lag_task.done():
+            self._lag_task = asyncio.create_task(self._monitor_lag())
+
+    async def _monitor_lag(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + LAG_SAMPLE_INTERVAL
+            await asyncio.sleep(LAG_SAMPLE_INTERVAL)
+            lag_ms = max(loop.time() - expected, 0.0) * 1000
+            self.loop_lag_ms += (lag_ms - self.loop_lag_ms) * LAG_SMOOTHING
+
+    def check(self):
+        """Returns None if a new room fits, else (reason code, description)"""
+        sessions = self.active_sessions + len(self._pending)
+        if self.max_sessions > 0 and sessions >= self.max_sessions:
+            return "sessions", f"{sessions} active sessions (max {self.max_sessions})"
+        if self.cpu_load >= self.cpu_threshold:
+            return "cpu", f"CPU {self.cpu_load:.0%} (max {self.cpu_threshold:.0%})"
+        if self.loop_lag_ms >= self.lag_threshold_ms:
+            return "loop_lag", f"event loop lag {self.loop_lag_ms:.0f}ms (max {self.lag_threshold_ms:.0f}ms)"
+        return None
+
+    def admit(self, job_id):
+        """Check a new room and count it as pending until its job shows up in active_jobs"""
+        rejection = self.check()
+        if rejection is None:
+            with self._pending_lock:
+                self._pending[job_id] = time.monotonic()
+            return True
+
+        reason, description = rejection
+        logger.warning("Rejecting room, worker over capacity: %s", description)
+        telemetry.emit({"type": "admission_rejected", "at": time.time(), "reason": reason})
+        return False
+
+
+admission = AdmissionController.from_env()
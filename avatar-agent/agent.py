@@ -5,14 +5,21 @@ This agent powers the "Talk to Ong" feature using LiveKit and Simli
 """
 
 import asyncio
+import json
 import logging
+import math
 import os
+import random
 import sys
-import aiohttp
 
-# Configure logging BEFORE importing livekit to reduce noise from internal health checks
-# These produce excessive "process is unresponsive" warnings that aren't actionable
-logging.getLogger("livekit.agents").setLevel(logging.ERROR)
+# AVATAR_PROFILE_STARTUP=1 times every import and init phase below; stdlib-only, so it goes first
+from startup_profile import startup_profile
+
+startup_profile.install()
+
+# Configure logging BEFORE importing livekit
+# "process is unresponsive" warnings stay visible; loop_monitor logs the stack that caused them
+logging.getLogger("livekit.agents").setLevel(logging.WARNING)
 logging.getLogger("livekit").setLevel(logging.WARNING)
 
 logger = logging.getLogger("ong-avatar-agent")
@@ -33,213 +40,677 @@ def _patch_rich_traceback():
         pass
 
 _patch_rich_traceback()
+startup_profile.checkpoint("rich_patch")
 
 from dotenv import load_dotenv
 
-from livekit.agents import Agent, AgentSession, JobContext, WorkerOptions, WorkerType, cli
-from livekit.plugins import google, simli
+from livekit.agents import (
+    Agent,
+    AgentSession,
+    JobContext,
+    JobExecutorType,
+    JobProcess,
+    JobRequest,
+    RoomInputOptions,
+    RoomOutputOptions,
+    WorkerOptions,
+    WorkerType,
+    cli,
+)
+from livekit.agents.voice.room_io import RoomIO
+
+startup_profile.checkpoint("livekit_agents")
 
 load_dotenv()
+startup_profile.checkpoint("dotenv")
+
+from admission import admission
+from autoscaler import pool_controller
+from circuit_breaker import gemini_breaker, simli_breaker
+from config import AgentConfig, parse_room_metadata
+from context_window import ContextWindow, gemini_summarizer
+from conversation_metrics import ConversationMetrics, metrics_reporter
+import fake_backends
+from greeting_cache import MIN_CLIP_SECONDS, GreetingCache, GreetingRecorder, greeting_key
+from key_pool import KeyPool, is_quota_error
+from loop_monitor import LoopMonitor
+from session_watchdog import SessionWatchdog
+from settings_cache import settings_cache
+from startup import StartupTimer
+import structured_logging
+from teardown import TeardownManager
+import telemetry
+from transcript_spool import TranscriptBuffer, transcript_spool
+
+# AVATAR_LOG_FORMAT=json: JSON lines with per-room fields, written off the event loop
+structured_logging.configure()
+
+startup_profile.checkpoint("agent_modules")
+
+# The Gemini and Simli plugins are the heaviest imports and only the process that
+# runs rooms needs them: job processes load them in prewarm, the main worker only
+# in thread executor mode (or for download-files). See load_plugins.
+google = None
+simli = None
+
+# Data-channel topic the Talk to Ong screen listens on for agent notices
+NOTICE_TOPIC = "ong-avatar"
+UNAVAILABLE_MESSAGE = "Ong is having trouble right now. Please try again in a minute."
+
+# Room metadata value the server sets when the client asks for voice only (weak link, data saver)
+AUDIO_ONLY_MODE = "audio"
+
+# Gemini connects after session.start() returns; a start with no reply or error by then counts as failed
+GEMINI_START_TIMEOUT = float(os.getenv("AVATAR_GEMINI_START_TIMEOUT", "20"))
+
+GREETING_INSTRUCTIONS = "Greet the user warmly and briefly introduce yourself based on your persona. Ask how you can help them today. Keep it natural and conversational."
+
+
+def load_plugins():
+    """Import the Gemini and Simli plugins (once)
+
+    LiveKit requires plugins to be imported on the main thread, which is where
+    prewarm runs in a job process and where __main__ runs in the worker.
+    """
+    global google, simli
+    if google is not None:
+        return
+    from livekit.plugins import google, simli
 
-# Default instructions (fallback if API is unavailable)
-DEFAULT_INSTRUCTIONS = """You are Ong, a friendly AI companion for the Mien Kingdom community.
 
-Your role:
-- Help users learn about Mien culture, traditions, and history
-- Assist with Mien language translation and pronunciation
-- Share knowledge about Mien cuisine, clothing, and customs
-- Be warm, patient, and encouraging with users of all ages
-- Speak naturally and conversationally, like a wise friend
+def build_realtime_model(gemini_key, avatar_settings):
+    if fake_backends.enabled():
+        return fake_backends.FakeRealtimeModel(
+            api_key=gemini_key,
+            voice=avatar_settings["voice"],
+            instructions=avatar_settings["prompt"],
+        )
+    return google.beta.realtime.RealtimeModel(
+        api_key=gemini_key,
+        voice=avatar_settings["voice"],
+        instructions=avatar_settings["prompt"],
+    )
 
-Guidelines:
-- Keep responses concise and conversational (1-3 sentences typically)
-- Use simple, clear language
-- Be respectful of Mien cultural traditions
-- If you don't know something about Mien culture, admit it honestly
-- Encourage users to explore and learn more about their heritage
 
-Remember: You represent the Mien Kingdom community - be welcoming and inclusive!
-"""
+def build_simli_config(config: AgentConfig):
+    return simli.SimliConfig(
+        api_key=config.simli_api_key,
+        face_id=config.simli_face_id,
+        max_session_length=config.max_session_length,
+        max_idle_time=config.max_idle_time,
+    )
+
 
-DEFAULT_VOICE = "Charon"
+def build_avatar_session(simli_config):
+    if fake_backends.enabled():
+        return fake_backends.FakeAvatarSession(simli_config=simli_config)
+    return simli.AvatarSession(simli_config=simli_config)
 
 
-async def fetch_avatar_settings():
-    """Fetch avatar settings from the API"""
-    api_base_url = os.getenv("API_BASE_URL", "http://localhost:5000")
-    settings_url = f"{api_base_url}/api/avatar/settings"
+async def start_room_audio(session: AgentSession, room):
+    """Publish the session's audio to the room directly, for when no avatar takes it over
 
+    The session was started with room audio output disabled (Simli owns it), so a
+    second, output-only RoomIO attaches it after the fact. Returns what to close.
+    """
+    room_io = RoomIO(
+        session,
+        room,
+        input_options=RoomInputOptions(audio_enabled=False, text_enabled=False, video_enabled=False),
+        output_options=RoomOutputOptions(audio_enabled=True, transcription_enabled=False),
+    )
+    await room_io.start()
+    return room_io
+
+
+def prewarm(proc: JobProcess):
+    """Runs once per job process while it sits idle, before any room is assigned"""
+    startup_profile.checkpoint("job_init")
+    load_plugins()
+    startup_profile.checkpoint("plugins")
+
+    config = AgentConfig.from_env()
+    proc.userdata["config"] = config
+    proc.userdata["key_pool"] = KeyPool.from_config(config)
+
+    if config.has_simli:
+        proc.userdata["simli_config"] = build_simli_config(config)
+
+    # Fetch the settings once and keep them current in the background, so rooms
+    # never fetch them and live sessions pick up admin changes
+    settings_cache.start_watching()
+
+    # Most rooms use the first key - build its model now so the Gemini client
+    # code is loaded and the common case needs no construction after ctx.connect()
+    if config.ordered_gemini_keys:
+        default_key = config.ordered_gemini_keys[0]
+        avatar_settings = settings_cache.peek()
+        proc.userdata["realtime_model"] = (
+            default_key,
+            avatar_settings,
+            build_realtime_model(default_key, avatar_settings),
+        )
+
+    logger.info("Prewarmed job process (gemini keys: %d)", len(config.ordered_gemini_keys))
+    startup_profile.checkpoint("prewarm")
+    startup_profile.report("job")
+
+
+def take_prewarmed_model(proc: JobProcess, gemini_key, avatar_settings):
+    """Return the prewarmed realtime model if it matches this room's key and settings"""
+    prewarmed = proc.userdata.pop("realtime_model", None)
+    if prewarmed is None:
+        return None
+    key, prewarmed_settings, model = prewarmed
+    if key != gemini_key or prewarmed_settings != avatar_settings:
+        return None
+    return model
+
+
+async def play_greeting(session: AgentSession, avatar_settings):
+    """Greet the user; returns "cached" or "generated" depending on where the audio came from"""
+    if not GreetingCache.enabled():
+        await session.generate_reply(instructions=GREETING_INSTRUCTIONS)
+        return "generated"
+
+    cache = GreetingCache()
+    key = greeting_key(avatar_settings["voice"], avatar_settings["prompt"], GREETING_INSTRUCTIONS)
+    clips = await asyncio.to_thread(cache.lookup, key)
+
+    # Once enough variants are recorded, play one straight away with no Gemini round trip
+    if len(clips) >= cache.max_clips:
+        clip = random.choice(clips)
+        await session.say(clip.text, audio=clip.frames())
+        return "cached"
+
+    with GreetingRecorder(session.output.audio) as recorder:
+        speech = session.generate_reply(instructions=GREETING_INSTRUCTIONS)
+        await speech
+
+    text = " ".join(
+        item.text_content for item in getattr(speech, "chat_items", [])
+        if getattr(item, "role", None) == "assistant" and item.text_content
+    )
+    if not speech.interrupted and text and recorder.duration >= MIN_CLIP_SECONDS:
+        cache.store_in_background(key, text, recorder.frames)
+    return "generated"
+
+
+async def publish_notice(ctx: JobContext, notice):
+    """Send the Talk to Ong screen a notice on the agent's data topic"""
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(settings_url, timeout=aiohttp.ClientTimeout(total=5)) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    logger.info(f"Fetched avatar settings: voice={data.get('voice')}")
-                    return {
-                        "voice": data.get("voice", DEFAULT_VOICE),
-                        "prompt": data.get("prompt", DEFAULT_INSTRUCTIONS),
-                    }
-                else:
-                    logger.warning(f"Failed to fetch avatar settings: HTTP {response.status}")
+        await ctx.room.local_participant.publish_data(json.dumps(notice), reliable=True, topic=NOTICE_TOPIC)
     except Exception as e:
-        logger.warning(f"Error fetching avatar settings: {e}")
+        logger.warning("Failed to send %s notice to room %s: %s", notice["type"], ctx.room.name, e)
 
-    # Return defaults if fetch fails
-    return {
-        "voice": DEFAULT_VOICE,
-        "prompt": DEFAULT_INSTRUCTIONS,
-    }
+
+async def notify_unavailable(ctx: JobContext, backend, retry_after):
+    """Tell the client straight away that the avatar can't start, instead of leaving it waiting"""
+    await publish_notice(ctx, {
+        "type": "avatar_unavailable",
+        "backend": backend,
+        "message": UNAVAILABLE_MESSAGE,
+        "retryAfterSeconds": math.ceil(retry_after),
+    })
+
+
+async def request_job(req: JobRequest):
+    """Runs in the main worker process for every room dispatched to this worker"""
+    admission.ensure_lag_monitor()
+    if not admission.admit(req.id):
+        # LiveKit offers a rejected room to another worker
+        await req.reject()
+        return
+    pool_controller.on_job_request()
+    await req.accept()
+
+
+def compute_load(worker) -> float:
+    """Reported worker load (sessions, CPU and loop lag); also drives the idle-process pool size"""
+    pool_controller.tick(worker)
+    return admission.update(worker, pool_controller.cpu_load)
 
 
 async def entrypoint(ctx: JobContext):
     """Main entry point for the avatar agent"""
-    
-    # Connect to the room first - this is CRITICAL for keeping the agent alive
-    await ctx.connect()
-    
-    logger.info(f"Starting Ong avatar agent for room: {ctx.room.name}")
-    
-    # Get API keys from environment
-    simli_api_key = os.getenv("SIMLI_API_KEY")
-    simli_face_id = os.getenv("SIMLI_FACE_ID")
-    
-    # Get Gemini key - support rotation via index passed in room metadata
-    gemini_key_index = 0
-    if ctx.room.metadata:
-        try:
-            import json
-            metadata = json.loads(ctx.room.metadata)
-            gemini_key_index = metadata.get("geminiKeyIndex", 0)
-        except:
-            pass
-    
-    # Select the appropriate Gemini key
-    gemini_key = None
-    for i in range(1, 6):
-        key_name = f"GEMINI_API_KEY_{i}"
-        key = os.getenv(key_name)
-        if key and i - 1 == gemini_key_index:
-            gemini_key = key
-            break
-    
-    # Fallback to first available key
-    if not gemini_key:
-        for i in range(1, 6):
-            key = os.getenv(f"GEMINI_API_KEY_{i}")
-            if key:
-                gemini_key = key
-                break
-    
-    if not gemini_key:
-        gemini_key = os.getenv("GOOGLE_AI_API_KEY")
-    
-    if not all([simli_api_key, simli_face_id, gemini_key]):
-        logger.error("Missing required API keys for avatar agent")
-        logger.error(f"SIMLI_API_KEY: {'set' if simli_api_key else 'missing'}")
-        logger.error(f"SIMLI_FACE_ID: {'set' if simli_face_id else 'missing'}")
-        logger.error(f"GEMINI_API_KEY: {'set' if gemini_key else 'missing'}")
-        return
-    
-    logger.info(f"Using Gemini key index: {gemini_key_index}")
+    try:
+        await run_session(ctx)
+    except Exception:
+        # In thread executor mode other rooms share this process - contain the failure to this room
+        logger.exception("Avatar session crashed for room: %s", ctx.job.room.name)
+
+
+async def run_session(ctx: JobContext):
+    timer = StartupTimer()
+    structured_logging.bind(room=ctx.job.room.name, jobId=ctx.job.id)
+
+    loop_monitor = None
+    if LoopMonitor.enabled():
+        loop_monitor = LoopMonitor.from_env()
+        loop_monitor.start()
+        ctx.add_shutdown_callback(loop_monitor.aclose)
+
+    # Process-level config comes from prewarm (parsed here only if prewarm was skipped)
+    config = ctx.proc.userdata.get("config") or AgentConfig.from_env()
+    # Also normally done in prewarm; a no-op once the plugins are loaded
+    load_plugins()
+
+    key_pool = ctx.proc.userdata.get("key_pool") or KeyPool.from_config(config)
+
+    # Room metadata is part of the job assignment, so the key can be chosen before connecting
+    # geminiKeyIndex is the server's preference; the pool overrides it for cooling or overloaded keys
+    metadata = parse_room_metadata(ctx.job.room.metadata)
+    structured_logging.bind(sessionId=metadata.get("sessionId"), userId=metadata.get("userId"))
+    # The pool's state file is flock'd and rewritten on every change, so keep it off the loop
+    key_lease = await asyncio.to_thread(key_pool.acquire, preferred_index=metadata.get("geminiKeyIndex"))
+    gemini_key = key_lease.key if key_lease else None
+
+    async def release_key():
+        await asyncio.to_thread(key_pool.release, key_lease)
+
+    ctx.add_shutdown_callback(release_key)
+
+    greeting_source = None
+    teardown = TeardownManager()
+    watchdog = None
+    context_window = None
+    audio_only_reason = None
+
+    async def emit_session_record():
+        timer.mark("close")
+        record = timer.record(
+            sessionId=metadata.get("sessionId"),
+            room=ctx.job.room.name,
+            loop=loop_monitor.summary() if loop_monitor else None,
+            greeting=greeting_source,
+            teardown=teardown.summary,
+            watchdog=watchdog.summary() if watchdog else None,
+            context=context_window.summary() if context_window else None,
+            audio_only=audio_only_reason,
+        )
+        logger.info("Session timeline: %s", json.dumps(record))
+        telemetry.emit(record)
 
-    # Fetch avatar settings from the API
-    avatar_settings = await fetch_avatar_settings()
-    voice = avatar_settings["voice"]
-    instructions = avatar_settings["prompt"]
+    ctx.add_shutdown_callback(emit_session_record)
 
-    logger.info(f"Using voice: {voice}")
+    conversation = None
 
-    # Create agent session with Google Gemini
-    session = AgentSession(
-        llm=google.beta.realtime.RealtimeModel(
-            api_key=gemini_key,
-            voice=voice,
-            instructions=instructions,
-        ),
-    )
+    async def report_conversation():
+        if conversation is None:
+            return
+        metrics_reporter.finish(conversation, timer.outcome)
+        # Job processes exit soon after shutdown, so send the final counts now;
+        # if this attempt fails the reporter thread keeps retrying while the process lives
+        await asyncio.to_thread(metrics_reporter.flush)
 
-    # Configure Simli avatar
-    simli_avatar = simli.AvatarSession(
-        simli_config=simli.SimliConfig(
-            api_key=simli_api_key,
-            face_id=simli_face_id,
-            max_session_length=3600,  # 1 hour max
-            max_idle_time=300,  # 5 minutes idle timeout
-        ),
-    )
+    ctx.add_shutdown_callback(report_conversation)
+
+    transcript = None
+
+    async def save_transcript():
+        if transcript is not None:
+            await transcript_spool.finish(transcript)
+
+    ctx.add_shutdown_callback(save_transcript)
 
-    # Start the avatar - it will join the room as a separate participant
+    if not (config.has_simli and gemini_key):
+        timer.outcome = "missing_keys"
+        logger.error("Missing required API keys for avatar agent")
+        logger.error("SIMLI_API_KEY: %s", "set" if config.simli_api_key else "missing")
+        logger.error("SIMLI_FACE_ID: %s", "set" if config.simli_face_id else "missing")
+        logger.error("GEMINI_API_KEY: %s", "set" if gemini_key else "missing")
+        return
+
+    if not settings_cache.watching:
+        # Normally started in prewarm; the first fetch blocks, so keep it off the loop
+        await asyncio.to_thread(settings_cache.start_watching)
+
+    # Connect to the room first - this is CRITICAL for keeping the agent alive
     try:
-        await simli_avatar.start(session, room=ctx.room)
-        logger.info("Simli avatar started successfully")
+        await timer.run("connect", ctx.connect())
     except Exception as e:
-        logger.error(f"Failed to start Simli avatar: {e}")
+        logger.error("Failed to connect to room: %s", e)
+        timer.outcome = "connect_failed"
+        return
+
+    # Voice only when the client asked for it or Simli's circuit is open; the conversation
+    # itself needs Gemini, so while its circuit is open the room is turned away now
+    # rather than after a slow failed start
+    # The breakers' state file is flock'd and rewritten on every change, so keep it off the loop
+    simli_permit = None
+    if metadata.get("avatarMode") == AUDIO_ONLY_MODE:
+        audio_only_reason = "requested"
+    else:
+        simli_permit = await asyncio.to_thread(simli_breaker.acquire)
+        if not simli_permit.allowed:
+            audio_only_reason = "simli_unavailable"
+    gemini_permit = await asyncio.to_thread(gemini_breaker.acquire)
+    if not gemini_permit.allowed:
+        if simli_permit is not None and simli_permit.probe:
+            await asyncio.to_thread(simli_breaker.cancel_probe)
+        timer.outcome = "circuit_open"
+        logger.warning("gemini circuit open, refusing room %s (retry in %.0fs)", ctx.room.name, gemini_permit.retry_after)
+        await notify_unavailable(ctx, "gemini", gemini_permit.retry_after)
         return
 
-    # Start the agent session
+    # From here each breaker's result (or cancellation) is owed for the permit just taken
+    simli_settled = False
     try:
-        await session.start(
-            agent=Agent(instructions=instructions),
-            room=ctx.room,
-        )
-        logger.info("Ong avatar agent is now active and ready to chat!")
-    except Exception as e:
-        logger.error(f"Failed to start agent session: {e}")
+        # Kept current by the settings watcher; later changes arrive through apply_settings
+        avatar_settings = settings_cache.peek()
+
+        logger.info("Starting Ong avatar agent for room: %s", ctx.room.name)
+        logger.info("Using Gemini key index: %d", key_lease.index)
+
+        voice = avatar_settings["voice"]
+        instructions = avatar_settings["prompt"]
+
+        logger.info("Using voice: %s (settings cache: %s)", voice, settings_cache.stats())
+
+        # Create agent session with Google Gemini
+        realtime_model = take_prewarmed_model(ctx.proc, gemini_key, avatar_settings)
+        if realtime_model is None:
+            realtime_model = build_realtime_model(gemini_key, avatar_settings)
+        session = AgentSession(llm=realtime_model)
+
+        # Turn, speaking-time and token counts for the server's avatar_sessions row
+        if metadata.get("avatarSessionId"):
+            conversation = ConversationMetrics(
+                metadata["avatarSessionId"],
+                session_id=metadata.get("sessionId"),
+                user_id=metadata.get("userId"),
+            )
+            conversation.attach(session)
+            metrics_reporter.track(conversation)
+
+        # Transcript lines for quality review; the spool thread writes them out in batches
+        if TranscriptBuffer.enabled():
+            transcript = TranscriptBuffer(
+                ctx.room.name,
+                session_id=metadata.get("sessionId"),
+                avatar_session_id=metadata.get("avatarSessionId"),
+            )
+            transcript.attach(session)
+            transcript_spool.track(transcript)
+
+        close_timeout = float(os.getenv("AVATAR_TEARDOWN_TIMEOUT", "5"))
+
+        # Configure Simli avatar
+        simli_avatar = None
+        if audio_only_reason is None:
+            simli_avatar = build_avatar_session(ctx.proc.userdata.get("simli_config") or build_simli_config(config))
+            # The Simli plugin's AvatarSession has no aclose (the avatar leaves with the room); close it if a version adds one
+            close_avatar = getattr(simli_avatar, "aclose", None)
+            if close_avatar is not None:
+                teardown.add("simli_avatar", close_avatar, timeout=close_timeout)
+        teardown.add("agent_session", session.aclose, timeout=close_timeout)
+
+        # Wait for the session to close (user disconnects or room ends)
+        # Registered before startup so a close during startup isn't missed
+        close_event = asyncio.Event()
+
+        @session.on("close")
+        def on_session_close():
+            logger.info("Session close event received for room: %s", ctx.room.name)
+            close_event.set()
+
+        @session.on("agent_state_changed")
+        def on_agent_state_changed(event):
+            if event.new_state == "speaking":
+                timer.mark("first_audio")
+
+        # The Gemini plugin connects in the background after session.start() returns and reports a
+        # failed connect later as an error event, so its breaker is settled by the first reply or error
+        gemini_started = asyncio.get_running_loop().create_future()
+
+        def settle_gemini(ok):
+            if not gemini_started.done():
+                gemini_started.set_result(ok)
+
+        @session.on("metrics_collected")
+        def on_metrics_collected(event):
+            if getattr(event.metrics, "type", None) == "realtime_model_metrics":
+                settle_gemini(True)
+
+        async def record_gemini_start():
+            try:
+                ok = await asyncio.wait_for(asyncio.shield(gemini_started), GEMINI_START_TIMEOUT)
+            except asyncio.TimeoutError:
+                if greeting_source == "cached":
+                    # Nothing has asked Gemini for a reply yet, so its silence says nothing; wait for the user's turn
+                    ok = await gemini_started
+                else:
+                    logger.warning("Gemini sent no reply within %.0fs of starting room %s", GEMINI_START_TIMEOUT, ctx.room.name)
+                    ok = False
+            await asyncio.to_thread(gemini_breaker.record, ok, probe=gemini_permit.probe)
+
+        async def stop_gemini_record():
+            if gemini_started.done():
+                await gemini_record  # Settled; let it finish writing the result
+                return
+            gemini_record.cancel()
+            if gemini_permit.probe:
+                # The room ended before Gemini proved anything either way
+                await asyncio.to_thread(gemini_breaker.cancel_probe)
+
+        def replace_agent(chat_ctx=None):
+            """Rebuild the agent on a fresh realtime session (current key and settings), seeded with chat_ctx or the conversation so far"""
+            session.update_agent(
+                Agent(
+                    instructions=avatar_settings["prompt"],
+                    llm=build_realtime_model(key_lease.key, avatar_settings),
+                    chat_ctx=chat_ctx if chat_ctx is not None else session.current_agent.chat_ctx,
+                )
+            )
+
+        def switch_gemini_key(new_lease):
+            """Move the conversation onto another key without dropping the room"""
+            nonlocal key_lease
+            key_lease = new_lease
+            replace_agent()
+
+        settings_tasks = set()
+
+        async def update_prompt(prompt):
+            try:
+                await session.current_agent.update_instructions(prompt)
+            except Exception as e:
+                logger.warning("Failed to apply the updated prompt to room %s: %s", ctx.room.name, e)
+
+        def apply_settings(new_settings):
+            """An admin changed the persona or voice
+
+            A new prompt is applied to the running agent. The realtime voice is
+            fixed per connection, so only a voice change rebuilds the agent.
+            """
+            nonlocal avatar_settings
+            previous, avatar_settings = avatar_settings, new_settings
+            if new_settings["voice"] != previous["voice"]:
+                logger.info("Applying updated avatar voice to room %s (voice=%s)", ctx.room.name, new_settings["voice"])
+                replace_agent()  # Picks up the new prompt too
+            elif new_settings["prompt"] != previous["prompt"]:
+                logger.info("Applying updated avatar prompt to room %s", ctx.room.name)
+                task = asyncio.create_task(update_prompt(new_settings["prompt"]))
+                settings_tasks.add(task)
+                task.add_done_callback(settings_tasks.discard)
+
+        # Hour-long sessions: fold older turns into a running summary once the context passes its budget
+        if ContextWindow.enabled():
+            context_window = ContextWindow.from_env(
+                summarize=None if fake_backends.enabled() else gemini_summarizer(lambda: key_lease.key),
+                reseed=replace_agent,
+            )
+            context_window.attach(session)
+            teardown.add("context_window", context_window.aclose)
+
+        # One failover at a time: a burst of quota errors from the same session must move it once
+        failover_lock = asyncio.Lock()
+        failover_tasks = set()
+
+        async def fail_over_key(failed_lease, error):
+            """Cool the exhausted key down and continue on another one, or end the room if none is left"""
+            nonlocal key_lease
+            async with failover_lock:
+                if key_lease is not failed_lease:
+                    return  # Already moved off that key (a late error from the old session)
+                new_lease = await asyncio.to_thread(key_pool.fail_over, failed_lease, error)
+                if new_lease is None:
+                    logger.error("Session error for room %s and no other Gemini key is available: %s", ctx.room.name, error)
+                    close_event.set()
+                    return
+                if close_event.is_set():
+                    # The room is ending; hold the lease so release_key frees it, but build nothing on it
+                    key_lease = new_lease
+                    return
+                switch_gemini_key(new_lease)
+
+        async def finish_failover():
+            close_event.set()  # Teardown has begun; an in-flight failover must not start a new agent
+            await asyncio.gather(*failover_tasks, return_exceptions=True)
+
+        teardown.add("key_failover", finish_failover)
+
+        # Also handle errors during the session
+        @session.on("error")
+        def on_session_error(event):
+            error = getattr(event, "error", event)
+            cause = getattr(error, "error", error)
+            if key_lease is not None and is_quota_error(cause):
+                # The Gemini plugin reports every failure as unrecoverable, and AgentSession closes
+                # itself on those right after this event; marking it recoverable keeps the session
+                # (and the room) open while the agent moves to a fresh realtime session on another key
+                if hasattr(error, "recoverable"):
+                    error.recoverable = True
+                task = asyncio.create_task(fail_over_key(key_lease, cause))
+                failover_tasks.add(task)
+                task.add_done_callback(failover_tasks.discard)
+                return
+            if getattr(error, "type", None) == "realtime_model_error" and not getattr(error, "recoverable", False):
+                settle_gemini(False)
+            if timer.outcome == "ok":
+                # Gemini connects after session.start() returns, so its failures land here, not in startup
+                timer.outcome = "session_error"
+            logger.error("Session error for room %s: %s", ctx.room.name, error)
+            close_event.set()
+
+        if simli_avatar is None:
+            # Voice only: Gemini's audio goes straight to the room
+            started = await timer.run_concurrently(
+                session_start=session.start(
+                    agent=Agent(instructions=instructions),
+                    room=ctx.room,
+                    room_output_options=RoomOutputOptions(audio_enabled=True),
+                ),
+            )
+        else:
+            # Simli negotiation and the Gemini realtime connection don't depend on each other,
+            # so they start together. The avatar joins the room as a separate participant and
+            # takes over the session's audio output, so room audio output stays disabled here.
+            started = await timer.run_concurrently(
+                simli_start=simli_avatar.start(session, room=ctx.room),
+                session_start=session.start(
+                    agent=Agent(instructions=instructions),
+                    room=ctx.room,
+                    room_output_options=RoomOutputOptions(audio_enabled=False),
+                ),
+            )
+            await asyncio.to_thread(
+                simli_breaker.record, not isinstance(started["simli_start"], BaseException), probe=simli_permit.probe,
+            )
+            simli_settled = True
+        if isinstance(started["session_start"], BaseException):
+            settle_gemini(False)
+        gemini_record = asyncio.create_task(record_gemini_start())
+        teardown.add("gemini_breaker", stop_gemini_record)
+    except BaseException:
+        # Nothing will settle a probe this room holds, so hand it back rather than leave the circuit half-open
+        if gemini_permit.probe:
+            await asyncio.to_thread(gemini_breaker.cancel_probe)
+        if simli_permit is not None and simli_permit.probe and not simli_settled:
+            await asyncio.to_thread(simli_breaker.cancel_probe)
+        raise
+
+    startup_error = None
+    if isinstance(started["session_start"], BaseException):
+        logger.error("Failed to start agent session: %s", started["session_start"])
+        startup_error = started["session_start"]
+
+    simli_error = started.get("simli_start")
+    if simli_avatar is not None and not isinstance(simli_error, BaseException):
+        logger.info("Simli avatar started successfully")
+    elif simli_avatar is not None and startup_error is not None:
+        logger.error("Failed to start Simli avatar: %s", simli_error)
+    elif simli_avatar is not None:
+        # Gemini is up, so keep the user with voice only rather than dropping the room
+        logger.error("Failed to start Simli avatar, continuing voice only: %s", simli_error)
+        audio_only_reason = "simli_failed"
+        try:
+            room_audio = await timer.run("room_audio", start_room_audio(session, ctx.room))
+            if room_audio is not None:
+                teardown.add("room_audio", room_audio.aclose, timeout=close_timeout)
+        except Exception as e:
+            logger.error("Failed to publish session audio to room %s: %s", ctx.room.name, e)
+            startup_error = e
+
+    if startup_error is not None:
+        timer.outcome = "startup_failed"
+        # Let the client stop waiting; one failed start doesn't open a circuit, so it can retry straight away
+        await notify_unavailable(ctx, "gemini" if isinstance(started["session_start"], BaseException) else "simli", 0)
+        # Release whichever half did start before giving up on the room
+        await teardown.run()
+        logger.info("Startup timings for room %s: %s", ctx.room.name, timer.summary())
         return
 
+    logger.info("Ong avatar agent is now active and ready to chat!")
+
+    if audio_only_reason is not None:
+        logger.info("Room %s is voice only (%s)", ctx.room.name, audio_only_reason)
+        await publish_notice(ctx, {"type": "avatar_mode", "mode": AUDIO_ONLY_MODE, "reason": audio_only_reason})
+
+    unsubscribe_settings = settings_cache.subscribe(apply_settings)
+
+    # End the session if the user leaves or goes quiet without a clean disconnect
+    watchdog = SessionWatchdog.from_env(ctx.room, close_event.set, config.max_session_length)
+    watchdog.attach(session)
+    watchdog.start()
+    teardown.add("watchdog", watchdog.aclose)
+
     # Generate initial greeting using the persona from admin settings
+    # Runs once the avatar owns the audio output so the greeting is lip-synced
     try:
-        await session.generate_reply(
-            instructions="Greet the user warmly and briefly introduce yourself based on your persona. Ask how you can help them today. Keep it natural and conversational."
-        )
-        logger.info(f"Agent session active for room: {ctx.room.name}")
+        greeting_source = await timer.run("greeting", play_greeting(session, avatar_settings))
+        logger.info("Agent session active for room: %s", ctx.room.name)
     except Exception as e:
-        logger.warning(f"Failed to generate initial greeting: {e}")
+        logger.warning("Failed to generate initial greeting: %s", e)
         # Continue anyway - greeting failure shouldn't crash the session
 
-    # Wait for the session to close (user disconnects or room ends)
-    close_event = asyncio.Event()
-
-    @session.on("close")
-    def on_session_close():
-        logger.info(f"Session close event received for room: {ctx.room.name}")
-        close_event.set()
-
-    # Also handle errors during the session
-    @session.on("error")
-    def on_session_error(error):
-        logger.error(f"Session error for room {ctx.room.name}: {error}")
-        close_event.set()
+    logger.info("Startup timings for room %s: %s", ctx.room.name, timer.summary())
 
     try:
         await close_event.wait()
     except asyncio.CancelledError:
-        logger.info(f"Session cancelled for room: {ctx.room.name}")
+        logger.info("Session cancelled for room: %s", ctx.room.name)
     except Exception as e:
-        logger.error(f"Error while waiting for session close: {e}")
+        logger.error("Error while waiting for session close: %s", e)
 
     # Proper cleanup to prevent event loop crashes
-    logger.info(f"Cleaning up session for room: {ctx.room.name}")
+    # Resources close concurrently with per-resource deadlines, so a hung Simli close
+    # can't hold the process until shutdown_process_timeout kills it
+    logger.info("Cleaning up session for room: %s", ctx.room.name)
+    unsubscribe_settings()
     try:
-        # Close the Simli avatar first
-        if simli_avatar:
-            try:
-                await simli_avatar.aclose()
-            except Exception as e:
-                logger.warning(f"Error closing Simli avatar: {e}")
-
-        # Close the agent session
-        if session:
-            try:
-                await session.aclose()
-            except Exception as e:
-                logger.warning(f"Error closing agent session: {e}")
+        await teardown.run()
     except asyncio.CancelledError:
         pass  # Ignore cancellation during cleanup
     except Exception as e:
-        logger.warning(f"Cleanup error (non-fatal): {e}")
+        logger.warning("Cleanup error (non-fatal): %s", e)
 
-    logger.info(f"Agent session ended for room: {ctx.room.name}")
+    timer.mark("close")
+    logger.info("Agent session ended for room: %s", ctx.room.name)
+
+    if watchdog.expired_reason:
+        # Leave the room too, so the job ends even though the user never disconnected
+        ctx.shutdown(reason=f"user {watchdog.expired_reason}")
 
 
 if __name__ == "__main__":
@@ -247,41 +718,70 @@ if __name__ == "__main__":
     required_vars = ["LIVEKIT_URL", "LIVEKIT_API_KEY", "LIVEKIT_API_SECRET"]
     missing = [v for v in required_vars if not os.getenv(v)]
     if missing:
-        logger.error(f"Missing required environment variables: {', '.join(missing)}")
+        logger.error("Missing required environment variables: %s", ", ".join(missing))
         logger.error("Avatar agent cannot start without LiveKit configuration")
         sys.exit(1)
 
+    config = AgentConfig.from_env()
+
     # Check for at least one Gemini key
-    has_gemini = any(os.getenv(f"GEMINI_API_KEY_{i}") for i in range(1, 6)) or os.getenv("GOOGLE_AI_API_KEY")
-    if not has_gemini:
+    if not config.has_gemini_key:
         logger.error("Missing Gemini API key (GEMINI_API_KEY_1 through _5, or GOOGLE_AI_API_KEY)")
         sys.exit(1)
 
     # Check Simli config
-    if not os.getenv("SIMLI_API_KEY") or not os.getenv("SIMLI_FACE_ID"):
+    if not config.has_simli:
         logger.error("Missing SIMLI_API_KEY or SIMLI_FACE_ID")
         sys.exit(1)
 
     logger.info("Environment validated, starting avatar agent...")
 
+    # AVATAR_JOB_EXECUTOR=thread hosts several rooms in one process (one thread and event
+    # loop per room) so plugins, settings and the key table are loaded once and shared;
+    # the default gives every room its own process
+    job_executor = os.getenv("AVATAR_JOB_EXECUTOR", "process")
+    job_executor_type = JobExecutorType.THREAD if job_executor == "thread" else JobExecutorType.PROCESS
+    logger.info("Job executor: %s", job_executor_type.name.lower())
+
+    # Rooms run in this process in thread mode, and download-files fetches plugin assets
+    if job_executor_type == JobExecutorType.THREAD or "download-files" in sys.argv:
+        load_plugins()
+        startup_profile.checkpoint("plugins")
+
+    # Optional Prometheus-style endpoint over the per-room records the job processes write
+    telemetry.start_metrics_server()
+
+    startup_profile.checkpoint("worker_setup")
+    startup_profile.report("worker")
+
     # Run the agent with exception handling
     # Use port=0 to auto-assign available port, avoiding "address already in use" errors on restart
-    # Use num_idle_processes=1 to reduce resource usage and "unresponsive" warnings
+    # LiveKit never keeps more idle processes than num_idle_processes, so the pool starts
+    # at AVATAR_MAX_IDLE_PROCESSES and pool_controller lowers it from the measured arrival
+    # rate; the worker then trims that further by its load headroom. compute_load tops out
+    # at 1.0, so at the threshold the worker reports itself full and stops getting rooms.
     try:
         cli.run_app(
             WorkerOptions(
                 entrypoint_fnc=entrypoint,
+                prewarm_fnc=prewarm,
+                request_fnc=request_job,
+                load_fnc=compute_load,
+                load_threshold=1.0,
                 worker_type=WorkerType.ROOM,
+                job_executor_type=job_executor_type,
                 port=0,
-                num_idle_processes=1,  # Default is 3 in prod, reduce to minimize resource usage
+                num_idle_processes=pool_controller.max_idle,
                 shutdown_process_timeout=30.0,  # Kill unresponsive processes after 30s (default 60s)
+                # SIGTERM (start mode): LiveKit marks the worker full and lets active rooms finish for up to this long
+                drain_timeout=int(os.getenv("AVATAR_DRAIN_TIMEOUT", "600")),
             ),
         )
     except KeyboardInterrupt:
         logger.info("Avatar agent stopped by user")
     except AssertionError as e:
         # LiveKit worker sometimes throws AssertionError during shutdown
-        logger.warning(f"Worker shutdown assertion (usually harmless): {e}")
+        logger.warning("Worker shutdown assertion (usually harmless): %s", e)
     except Exception as e:
-        logger.error(f"Avatar agent error: {e}")
+        logger.error("Avatar agent error: %s", e)
         sys.exit(1)
@@ -0,0 +1,116 @@
+"""
+Shared HTTP client for calls from the avatar agent to the Node API server
+One pooled aiohttp session per process, reused by every caller
+"""
+
+import asyncio
+import atexit
+import logging
+import os
+import threading
+from typing import Any, Mapping, NamedTuple
+
+import aiohttp
+
+logger = logging.getLogger("ong-avatar-agent")
+
+DEFAULT_TIMEOUT_SECONDS = 5
+
+
+class ApiResponse(NamedTuple):
+    status: int
+    data: Any
+    headers: Mapping[str, str]  # Case-insensitive
+
+
+def is_permanent_error(status):
+    """A 4xx the same request will get again (bad token, bad payload); timeouts and rate limits can pass"""
+    return 400 <= status < 500 and status not in (408, 429)
+
+
+class ApiClient:
+    """Long-lived, connection-pooled client for API_BASE_URL
+
+    The callers are background threads (the settings watcher, the metrics
+    reporter) that outlive any one room, and an aiohttp session can't cross
+    event loops, so the session lives on a small event loop thread of its own,
+    started on first use. Requests block the calling thread; from a room's
+    event loop, call them through asyncio.to_thread.
+    """
+
+    def __init__(self, base_url, max_connections=8, keepalive_timeout=30.0):
+        self.base_url = base_url.rstrip("/")
+        self.max_connections = max_connections
+        self.keepalive_timeout = keepalive_timeout
+        self._loop = None
+        self._session = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            os.getenv("API_BASE_URL", "http://localhost:5000"),
+            max_connections=int(os.getenv("AVATAR_API_MAX_CONNECTIONS", "8")),
+        )
+
+    def url(self, path):
+        return f"{self.base_url}{path}"
+
+    def _get_loop(self):
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever, name="avatar-api-client", daemon=True).start()
+                atexit.register(self.close)
+            return self._loop
+
+    def _get_session(self):
+        """Runs on the client's loop"""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.max_connections,  # Bounds concurrent requests; extra callers queue
+                keepalive_timeout=self.keepalive_timeout,
+                ttl_dns_cache=300,
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=DEFAULT_TIMEOUT_SECONDS),
+            )
+        return self._session
+
+    async def _request(self, method, path, json, headers, timeout):
+        kwargs = {"json": json, "headers": headers}
+        if timeout:
+            kwargs["timeout"] = aiohttp.ClientTimeout(total=timeout)
+        async with self._get_session().request(method, self.url(path), **kwargs) as response:
+            data = None
+            if 200 <= response.status < 300 and response.content_type == "application/json":
+                data = await response.json()
+            return ApiResponse(response.status, data, response.headers.copy())
+
+    def request_json(self, method, path, *, json=None, headers=None, timeout=None):
+        """Send a request and decode a JSON body (None for non-2xx or empty responses); blocking
+
+        Network errors and timeouts raise; HTTP errors are returned as the status.
+        """
+        future = asyncio.run_coroutine_threadsafe(
+            self._request(method, path, json, headers, timeout), self._get_loop()
+        )
+        return future.result()
+
+    def close(self):
+        """Close the pooled connections; runs at interpreter exit"""
+        if self._session is not None and not self._session.closed:
+            try:
+                asyncio.run_coroutine_threadsafe(self._session.close(), self._loop).result(timeout=DEFAULT_TIMEOUT_SECONDS)
+            except Exception as e:
+                logger.warning("Failed to close API client: %s", e)
+
+    def get_json(self, path, **kwargs):
+        return self.request_json("GET", path, **kwargs)
+
+    def post_json(self, path, payload, **kwargs):
+        return self.request_json("POST", path, json=payload, **kwargs)
+
+
+api_client = ApiClient.from_env()
@@ -0,0 +1,192 @@
+"""
+Adaptive idle-process pool for the avatar worker
+Sizes the number of prewarmed job processes from the measured room arrival
+rate and session length, within memory and CPU limits. Runs in the main
+worker process and is ticked from the worker's load function.
+"""
+
+import collections
+import logging
+import math
+import os
+import threading
+import time
+
+import telemetry
+
+logger = logging.getLogger("ong-avatar-agent")
+
+try:
+    import psutil  # Installed with livekit-agents
+except ImportError:  # pragma: no cover
+    psutil = None
+
+# Arrivals over the short window catch bursts; the long window drives the memory estimate
+BURST_WINDOW_SECONDS = 60.0
+LONG_WINDOW_SECONDS = 900.0
+# Assumed job process size until one has been measured
+DEFAULT_PROCESS_MB = 350.0
+
+
+def _env_float(name, default):
+    return float(os.getenv(name, str(default)))
+
+
+class IdlePoolController:
+    """Chooses the idle-process target from arrival rate and resource headroom
+
+    Enough processes are kept warm to absorb the arrivals expected while a
+    replacement process spawns and prewarms. The target is capped by the memory
+    left after active and expected sessions, and drops to the minimum under
+    CPU pressure.
+
+    The worker is started with max_idle as its idle-process count, which is
+    also the most LiveKit's pool will ever keep warm; the controller only
+    lowers the worker's idle count below it. After each load report the
+    worker gives the pool the smaller of that count and what its remaining
+    load headroom allows. Lowering the target stops replacement processes
+    from being spawned but doesn't stop ones already warm.
+    """
+
+    def __init__(self, min_idle=1, max_idle=4, warmup_seconds=8.0, headroom=1.5,
+                 memory_limit_mb=0.0, cpu_limit=0.85):
+        self.min_idle = min_idle
+        self.max_idle = max(min_idle, max_idle)
+        self.warmup_seconds = warmup_seconds
+        self.headroom = headroom
+        self.memory_limit_mb = memory_limit_mb
+        self.cpu_limit = cpu_limit
+        self.target = min_idle
+        self.cpu_load = 0.0
+        self._applied = None  # Target last handed to the worker's pool (None: not yet)
+        self._adjustable = True
+        self._arrivals = collections.deque()
+        self._durations = collections.deque(maxlen=200)
+        self._active_started = {}
+        self._lock = threading.Lock()
+        self._baseline_rss_mb = None
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            min_idle=int(os.getenv("AVATAR_MIN_IDLE_PROCESSES", "1")),
+            max_idle=int(os.getenv("AVATAR_MAX_IDLE_PROCESSES", "4")),
+            warmup_seconds=_env_float("AVATAR_PROCESS_WARMUP_SECONDS", 8.0),
+            memory_limit_mb=_env_float("AVATAR_POOL_MEMORY_LIMIT_MB", 0),
+            cpu_limit=_env_float("AVATAR_POOL_CPU_LIMIT", 0.85),
+        )
+
+    def on_job_request(self):
+        """Called from the request handler on the worker's event loop"""
+        with self._lock:
+            self._arrivals.append(time.monotonic())
+
+    def _arrival_rate(self, window, now):
+        return sum(1 for t in self._arrivals if now - t <= window) / window
+
+    def _track_sessions(self, worker, now):
+        active_ids = {job.job.id for job in worker.active_jobs}
+        for job_id in active_ids - self._active_started.keys():
+            self._active_started[job_id] = now
+        for job_id in self._active_started.keys() - active_ids:
+            self._durations.append(now - self._active_started.pop(job_id))
+        return len(active_ids)
+
+    def _process_mb(self, active):
+        """Memory one more room costs: a job process, or in thread mode its share of this process"""
+        if psutil is None:
+            return DEFAULT_PROCESS_MB
+        try:
+            process = psutil.Process()
+            children = process.children(recursive=True)
+            if children:
+                return max(child.memory_info().rss for child in children) / (1024 * 1024)
+            rss_mb = process.memory_info().rss / (1024 * 1024)
+        except psutil.Error:
+            return DEFAULT_PROCESS_MB
+        if self._baseline_rss_mb is None:
+            self._baseline_rss_mb = rss_mb
+        if active == 0:
+            return DEFAULT_PROCESS_MB
+        return max((rss_mb - self._baseline_rss_mb) / active, 1.0)
+
+    def _memory_budget_mb(self):
+        available = psutil.virtual_memory().available / (1024 * 1024) if psutil else float("inf")
+        if self.memory_limit_mb > 0:
+            return min(self.memory_limit_mb, available)
+        return available
+
+    def tick(self, worker):
+        """Recompute the target; runs in the load-function executor thread"""
+        now = time.monotonic()
+        with self._lock:
+            while self._arrivals and now - self._arrivals[0] > LONG_WINDOW_SECONDS:
+                self._arrivals.popleft()
+            burst_rate = self._arrival_rate(BURST_WINDOW_SECONDS, now)
+            long_rate = self._arrival_rate(LONG_WINDOW_SECONDS, now)
+
+        active = self._track_sessions(worker, now)
+        mean_duration = sum(self._durations) / len(self._durations) if self._durations else 0.0
+        if psutil is not None:
+            self.cpu_load = psutil.cpu_percent(interval=None) / 100.0
+
+        # Rooms expected to arrive while one replacement process warms up
+        demand = math.ceil(max(burst_rate, long_rate) * self.warmup_seconds * self.headroom)
+        target = min(max(demand, self.min_idle), self.max_idle)
+        reason = f"demand={demand}"
+
+        # Little's law: sessions expected to be running at the long-run arrival rate
+        expected_active = max(active, long_rate * mean_duration)
+        process_mb = self._process_mb(active)
+        memory_budget = self._memory_budget_mb()
+        if math.isfinite(memory_budget):
+            # The budget is what's still free, so only sessions not yet running need reserving
+            spare = memory_budget - (expected_active - active) * process_mb
+            memory_cap = max(int(spare // process_mb), 0)
+            if memory_cap < target:
+                target = max(memory_cap, self.min_idle)
+                reason = f"memory cap={memory_cap}"
+
+        if self.cpu_load >= self.cpu_limit:
+            target = self.min_idle
+            reason = f"cpu {self.cpu_load:.0%}"
+
+        if target != self.target:
+            logger.info(
+                "Idle process target %d -> %d (%s; arrivals %.1f/min burst, %.1f/min avg; "
+                "mean session %.0fs; active %d; ~%.0fMB/process)",
+                self.target, target, reason, burst_rate * 60, long_rate * 60,
+                mean_duration, active, process_mb,
+            )
+            telemetry.emit({
+                "type": "idle_pool",
+                "at": time.time(),
+                "previous": self.target,
+                "target": target,
+                "reason": reason,
+                "burst_rate_per_min": round(burst_rate * 60, 2),
+                "avg_rate_per_min": round(long_rate * 60, 2),
+                "mean_session_seconds": round(mean_duration, 1),
+                "active": active,
+            })
+            self.target = target
+        if target != self._applied:
+            self._apply(worker, target)
+
+    def _apply(self, worker, target):
+        if not self._adjustable:
+            return
+        # Not public API (checked against livekit-agents 1.3): the worker's load task reads this
+        # right after the load function returns and sizes the pool from it, so setting the pool
+        # directly would just be overwritten. Without it the pool keeps max_idle warm.
+        if not hasattr(worker, "_num_idle_processes"):
+            self._adjustable = False
+            logger.warning(
+                "Worker does not expose its idle-process count; keeping %d idle processes", self.max_idle,
+            )
+            return
+        self._applied = target
+        worker._num_idle_processes = target
+
+
+pool_controller = IdlePoolController.from_env()
@@ -0,0 +1,145 @@
+"""
+Startup circuit breakers for the avatar's backends (Simli, Gemini)
+
+Every room records whether each backend started. When recent startups fail
+often enough the circuit opens and new rooms are turned away at once
+instead of spending several seconds (and a process) on a start that will
+fail. After a cooldown one room is let through as a probe: success closes
+the circuit, failure reopens it. State lives in a flock-guarded JSON file
+like the key pool's, so every job process on the host shares it.
+"""
+
+import logging
+import os
+import time
+from dataclasses import dataclass
+
+import telemetry
+from shared_state import locked_json, pid_alive
+
+logger = logging.getLogger("ong-avatar-agent")
+
+STATE_FILE = os.getenv("AVATAR_CIRCUIT_STATE", "/tmp/ong-avatar-circuits.json")
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+@dataclass(frozen=True)
+class Permit:
+    allowed: bool
+    probe: bool = False
+    retry_after: float = 0.0
+
+
+class CircuitBreaker:
+    """Failure-rate breaker for one backend's startup
+
+    Wall-clock time is used throughout because other processes read the
+    timestamps. A probe whose process dies (or that never reports) is given
+    up after probe_timeout so the circuit can't stay half-open forever.
+    """
+
+    def __init__(
+        self,
+        name,
+        state_file=STATE_FILE,
+        window_seconds=120.0,
+        min_samples=4,
+        failure_rate=0.5,
+        cooldown_seconds=30.0,
+        probe_timeout=60.0,
+    ):
+        self.name = name
+        self.state_file = state_file
+        self.window_seconds = window_seconds
+        self.min_samples = min_samples
+        self.failure_rate = failure_rate
+        self.cooldown_seconds = cooldown_seconds
+        self.probe_timeout = probe_timeout
+
+    @classmethod
+    def from_env(cls, name):
+        return cls(
+            name,
+            window_seconds=float(os.getenv("AVATAR_CIRCUIT_WINDOW_SECONDS", "120")),
+            min_samples=int(os.getenv("AVATAR_CIRCUIT_MIN_SAMPLES", "4")),
+            failure_rate=float(os.getenv("AVATAR_CIRCUIT_FAILURE_RATE", "0.5")),
+            cooldown_seconds=float(os.getenv("AVATAR_CIRCUIT_COOLDOWN_SECONDS", "30")),
+        )
+
+    def _entry(self, state, now):
+        entry = state.setdefault(self.name, {"state": CLOSED, "results": [], "opened_at": 0, "probe": None})
+        entry["results"] = [r for r in entry["results"] if now - r[0] < self.window_seconds]
+        probe = entry["probe"]
+        if probe and (now - probe["at"] > self.probe_timeout or not pid_alive(probe["pid"])):
+            entry["probe"] = None
+        return entry
+
+    def acquire(self):
+        """Ask to start the backend for a new room"""
+        now = time.time()
+        with locked_json(self.state_file) as state:
+            entry = self._entry(state, now)
+            if entry["state"] == CLOSED:
+                return Permit(True)
+
+            if entry["state"] == OPEN:
+                remaining = entry["opened_at"] + self.cooldown_seconds - now
+                if remaining > 0:
+                    return Permit(False, retry_after=remaining)
+                entry["state"] = HALF_OPEN
+
+            # Half-open: exactly one room at a time tests the backend
+            if entry["probe"] is not None:
+                return Permit(False, retry_after=self.cooldown_seconds)
+            entry["probe"] = {"pid": os.getpid(), "at": now}
+            logger.info("Circuit %s half-open: probing with this room", self.name)
+            return Permit(True, probe=True)
+
+    def record(self, ok, probe=False):
+        """Report how a permitted start went"""
+        now = time.time()
+        transition = None
+        with locked_json(self.state_file) as state:
+            entry = self._entry(state, now)
+            if probe:
+                entry["probe"] = None
+                if ok:
+                    entry.update(state=CLOSED, results=[])
+                    logger.info("Circuit %s closed: probe succeeded", self.name)
+                else:
+                    entry.update(state=OPEN, opened_at=now)
+                    logger.warning("Circuit %s reopened: probe failed", self.name)
+                transition = entry["state"]
+            else:
+                transition = self._record_result(entry, ok, now)
+        if transition is not None:
+            telemetry.emit({"type": "circuit", "at": now, "backend": self.name, "state": transition})
+
+    def _record_result(self, entry, ok, now):
+        entry["results"].append([now, bool(ok)])
+        if entry["state"] != CLOSED:
+            return None  # A start admitted before the circuit opened; the probe decides
+        samples = len(entry["results"])
+        failures = sum(1 for _, result_ok in entry["results"] if not result_ok)
+        if samples < self.min_samples or failures / samples < self.failure_rate:
+            return None
+        entry.update(state=OPEN, opened_at=now)
+        logger.warning(
+            "Circuit %s opened: %d of %d starts failed in the last %.0fs",
+            self.name, failures, samples, self.window_seconds,
+        )
+        return OPEN
+
+    def cancel_probe(self):
+        """Give back a probe permit that was never used (the room didn't get as far as starting)"""
+        with locked_json(self.state_file) as state:
+            entry = self._entry(state, time.time())
+            if entry["probe"] and entry["probe"]["pid"] == os.getpid():
+                entry["probe"] = None
+
+
+simli_breaker = CircuitBreaker.from_env("simli")
+gemini_breaker = CircuitBreaker.from_env("gemini")
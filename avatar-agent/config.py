@@ -0,0 +1,66 @@
+"""
+Environment configuration for the avatar agent
+Parsed once per process (in prewarm) instead of on every room
+"""
+
+import json
+import os
+from dataclasses import dataclass, field
+from typing import Optional
+
+MAX_GEMINI_KEYS = 5
+
+
+@dataclass(frozen=True)
+class AgentConfig:
+    simli_api_key: Optional[str]
+    simli_face_id: Optional[str]
+    # Slot index (GEMINI_API_KEY_1 -> 0) to key, for every configured slot
+    gemini_keys: dict = field(default_factory=dict)
+    google_ai_api_key: Optional[str] = None
+    max_session_length: int = 3600  # 1 hour max
+    max_idle_time: int = 300  # 5 minutes idle timeout
+
+    @classmethod
+    def from_env(cls):
+        gemini_keys = {}
+        for i in range(1, MAX_GEMINI_KEYS + 1):
+            key = os.getenv(f"GEMINI_API_KEY_{i}")
+            if key and key.strip():
+                gemini_keys[i - 1] = key.strip()
+
+        return cls(
+            simli_api_key=os.getenv("SIMLI_API_KEY"),
+            simli_face_id=os.getenv("SIMLI_FACE_ID"),
+            gemini_keys=gemini_keys,
+            google_ai_api_key=os.getenv("GEMINI_AVATAR_API_KEY") or os.getenv("GOOGLE_AI_API_KEY"),
+            max_session_length=int(os.getenv("SIMLI_MAX_SESSION_LENGTH", "3600")),
+            max_idle_time=int(os.getenv("SIMLI_MAX_IDLE_TIME", "300")),
+        )
+
+    @property
+    def has_gemini_key(self):
+        return bool(self.gemini_keys) or bool(self.google_ai_api_key)
+
+    @property
+    def has_simli(self):
+        return bool(self.simli_api_key and self.simli_face_id)
+
+    @property
+    def ordered_gemini_keys(self):
+        """Configured keys in slot order, matching the list server/services/gemini-keys.ts
+        indexes when it writes geminiKeyIndex into the room metadata"""
+        if self.gemini_keys:
+            return [self.gemini_keys[slot] for slot in sorted(self.gemini_keys)]
+        return [self.google_ai_api_key] if self.google_ai_api_key else []
+
+
+def parse_room_metadata(raw):
+    """Decode the JSON metadata the server writes when it creates an Ong room"""
+    if not raw:
+        return {}
+    try:
+        metadata = json.loads(raw)
+    except (TypeError, ValueError):
+        return {}
+    return metadata if isinstance(metadata, dict) else {}
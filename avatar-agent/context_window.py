@@ -0,0 +1,217 @@
+"""
+Bounded conversation context for long avatar sessions
+Sessions can run for an hour, and the realtime model re-reads the whole
+conversation on every turn. Once the context passes a token budget, the
+older turns are folded into a running summary message and only the most
+recent turns are kept verbatim. Gemini Live can only append to a live
+session's history, so the compacted context is applied by starting a fresh
+realtime session seeded with it. Persona instructions live on the Agent,
+not in the chat history, so they are never compacted.
+"""
+
+import asyncio
+import logging
+import os
+import time
+
+from livekit.agents import llm
+
+logger = logging.getLogger("ong-avatar-agent")
+
+SUMMARY_ID = "ong-context-summary"
+SUMMARY_PREFIX = "Summary of the earlier conversation (for context; don't repeat it back):\n"
+SUMMARY_INSTRUCTIONS = (
+    "Update the running summary of a voice conversation between a user and Ong, a Mien cultural companion. "
+    "Keep names, facts the user shared about themselves, open questions and anything Ong promised. "
+    "Write at most 150 words of plain prose."
+)
+# Rough characters per token for the text estimate
+CHARS_PER_TOKEN = 4
+# Extractive fallback keeps this many characters of each folded message
+FALLBACK_CHARS_PER_MESSAGE = 160
+# ...and keeps only the newest end of the result, so it can't grow without bound
+FALLBACK_MAX_CHARS = 2400
+
+
+def _estimate_tokens(text):
+    return len(text) // CHARS_PER_TOKEN + 1 if text else 0
+
+
+def _is_summary(item):
+    return item.id == SUMMARY_ID
+
+
+class ContextWindow:
+    """Watches a session's context size and compacts it between turns
+
+    Size is the larger of a text estimate over the chat history and the
+    input tokens the realtime model last reported, since audio turns cost
+    far more tokens than their transcripts suggest.
+
+    reseed(chat_ctx) replaces the session's agent with one on a fresh realtime
+    session seeded with chat_ctx; without it the agent's history is edited in
+    place, which only works for models that support removing messages.
+    """
+
+    def __init__(self, summarize=None, reseed=None, max_tokens=12000, keep_messages=12):
+        self.session = None
+        self.summarize = summarize
+        self.reseed = reseed
+        self.max_tokens = max_tokens
+        self.keep_messages = keep_messages
+        self.turns = 0
+        self.estimated_tokens = 0
+        self.reported_tokens = 0
+        self.peak_tokens = 0
+        self.compactions = 0
+        self.summary_failures = 0
+        self._task = None
+
+    @classmethod
+    def from_env(cls, summarize=None, reseed=None):
+        return cls(
+            summarize=summarize,
+            reseed=reseed,
+            max_tokens=int(os.getenv("AVATAR_CONTEXT_MAX_TOKENS", "12000")),
+            keep_messages=int(os.getenv("AVATAR_CONTEXT_KEEP_MESSAGES", "12")),
+        )
+
+    @staticmethod
+    def enabled():
+        return os.getenv("AVATAR_CONTEXT_MAX_TOKENS", "12000") != "0"
+
+    @property
+    def tokens(self):
+        return max(self.estimated_tokens, self.reported_tokens)
+
+    def attach(self, session):
+        self.session = session
+
+        @session.on("conversation_item_added")
+        def on_item_added(event):
+            self.turns += 1
+            self.estimated_tokens += _estimate_tokens(getattr(event.item, "text_content", None))
+            self.peak_tokens = max(self.peak_tokens, self.tokens)
+            # Compact right after a reply, when the next turn is furthest away
+            if getattr(event.item, "role", None) == "assistant":
+                self._maybe_compact()
+
+        @session.on("metrics_collected")
+        def on_metrics_collected(event):
+            input_tokens = getattr(event.metrics, "input_tokens", None)
+            if input_tokens:
+                self.reported_tokens = input_tokens
+                self.peak_tokens = max(self.peak_tokens, self.tokens)
+
+    def _maybe_compact(self):
+        if self.tokens < self.max_tokens or (self._task is not None and not self._task.done()):
+            return
+        self._task = asyncio.create_task(self._compact())
+
+    async def _compact(self):
+        try:
+            await self._compact_once()
+        except Exception as e:
+            logger.warning("Failed to compact conversation context: %s", e)
+
+    async def _compact_once(self):
+        agent = self.session.current_agent
+        chat_ctx = agent.chat_ctx
+        messages = [item for item in chat_ctx.items if item.type == "message" and not _is_summary(item)]
+        # Persona and other system messages stay as they are; only dialogue is folded
+        dialogue = [m for m in messages if m.role in ("user", "assistant")]
+        if len(dialogue) <= self.keep_messages:
+            return
+        folded, recent = dialogue[: -self.keep_messages], dialogue[-self.keep_messages :]
+        previous = next((item.text_content for item in chat_ctx.items if _is_summary(item)), None)
+        if previous:
+            previous = previous.removeprefix(SUMMARY_PREFIX)
+
+        started = time.monotonic()
+        summary = await self._summarize(previous, folded)
+        if self.session.current_agent is not agent:
+            return  # The agent was replaced (key or settings change) meanwhile; retry after the next reply
+
+        # Keep whatever arrived while the summary was being written
+        folded_ids = {m.id for m in folded}
+        kept = [item for item in agent.chat_ctx.items if item.id not in folded_ids and not _is_summary(item)]
+        system = [item for item in kept if item.type == "message" and item.role not in ("user", "assistant")]
+        system_ids = {item.id for item in system}
+        rest = [item for item in kept if item.id not in system_ids]
+        # Not a system message: the realtime plugin may fold those into the instructions
+        summary_message = llm.ChatMessage(id=SUMMARY_ID, role="assistant", content=[SUMMARY_PREFIX + summary])
+        compacted = llm.ChatContext(items=system + [summary_message] + rest)
+        if self.reseed is not None:
+            self.reseed(compacted)
+        else:
+            await agent.update_chat_ctx(compacted)
+
+        before = self.tokens
+        self.compactions += 1
+        self.estimated_tokens = sum(
+            _estimate_tokens(item.text_content) for item in compacted.items if item.type == "message"
+        )
+        self.reported_tokens = 0  # Stale until the model reports on the compacted context
+        logger.info(
+            "Compacted conversation context: %d messages folded into summary, %d kept, ~%d -> ~%d tokens in %.0fms",
+            len(folded), len(recent), before, self.estimated_tokens, (time.monotonic() - started) * 1000,
+        )
+
+    async def _summarize(self, previous, messages):
+        lines = [f"{m.role}: {m.text_content}" for m in messages if m.text_content]
+        if self.summarize is not None:
+            try:
+                return await self.summarize(previous, "\n".join(lines))
+            except Exception as e:
+                self.summary_failures += 1
+                logger.warning("Context summary failed, keeping an excerpt instead: %s", e)
+        # Extractive fallback: the previous summary plus the start of each folded line
+        excerpt = [line[:FALLBACK_CHARS_PER_MESSAGE] for line in lines]
+        return "\n".join(([previous] if previous else []) + excerpt)[-FALLBACK_MAX_CHARS:]
+
+    async def aclose(self):
+        if self._task is not None:
+            self._task.cancel()
+
+    def summary(self):
+        return {
+            "turns": self.turns,
+            "tokens": self.tokens,
+            "peak_tokens": self.peak_tokens,
+            "compactions": self.compactions,
+            "summary_failures": self.summary_failures,
+        }
+
+
+def gemini_summarizer(get_api_key, model=None):
+    """A summarize(previous, transcript) callable backed by a Gemini text model
+
+    get_api_key is called for every summary, so a room that failed over to
+    another key summarizes on the key it is using now.
+    """
+    # Already loaded wherever rooms run (see agent.load_plugins)
+    from livekit.plugins import google
+
+    model = model or os.getenv("AVATAR_CONTEXT_SUMMARY_MODEL", "gemini-2.0-flash")
+    clients = {}
+
+    async def summarize(previous, transcript):
+        api_key = get_api_key()
+        summary_llm = clients.get(api_key)
+        if summary_llm is None:
+            clients.clear()
+            summary_llm = clients[api_key] = google.LLM(model=model, api_key=api_key)
+        chat_ctx = llm.ChatContext()
+        chat_ctx.add_message(role="system", content=SUMMARY_INSTRUCTIONS)
+        chat_ctx.add_message(
+            role="user",
+            content=f"Summary so far:\n{previous or '(none)'}\n\nNewer conversation:\n{transcript}",
+        )
+        parts = []
+        async with summary_llm.chat(chat_ctx=chat_ctx) as stream:
+            async for chunk in stream:
+                if chunk.delta and chunk.delta.content:
+                    parts.append(chunk.delta.content)
+        return "".join(parts).strip()
+
+    return summarize
@@ -0,0 +1,206 @@
+"""
+Per-session conversation metrics (turns, speaking time, token usage)
+Counted from session events in memory and pushed to the API in batches by
+one reporter thread per process - never a request per event.
+"""
+
+import logging
+import os
+import threading
+import time
+
+from api_client import api_client, is_permanent_error
+
+logger = logging.getLogger("ong-avatar-agent")
+
+METRICS_PATH = "/api/avatar/agent/metrics"
+FLUSH_INTERVAL_SECONDS = float(os.getenv("AVATAR_METRICS_FLUSH_SECONDS", "30"))
+MAX_BACKOFF_SECONDS = 300
+REQUEST_TIMEOUT_SECONDS = 5
+
+
+class ConversationMetrics:
+    """Running totals for one session; snapshots are cumulative, so resending one is harmless"""
+
+    def __init__(self, avatar_session_id, session_id=None, user_id=None):
+        self.avatar_session_id = avatar_session_id
+        self.session_id = session_id
+        self.user_id = user_id
+        self.started_at = time.monotonic()
+        self.user_messages = 0
+        self.avatar_responses = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.user_speaking = 0.0
+        self.agent_speaking = 0.0
+        self._user_speaking_since = None
+        self._agent_speaking_since = None
+
+    def attach(self, session):
+        @session.on("conversation_item_added")
+        def on_item_added(event):
+            role = getattr(event.item, "role", None)
+            if role == "user":
+                self.user_messages += 1
+            elif role == "assistant":
+                self.avatar_responses += 1
+
+        @session.on("user_state_changed")
+        def on_user_state_changed(event):
+            self._user_speaking_since = self._track(
+                event.new_state == "speaking", self._user_speaking_since, "user_speaking"
+            )
+
+        @session.on("agent_state_changed")
+        def on_agent_state_changed(event):
+            self._agent_speaking_since = self._track(
+                event.new_state == "speaking", self._agent_speaking_since, "agent_speaking"
+            )
+
+        @session.on("metrics_collected")
+        def on_metrics_collected(event):
+            # Realtime model metrics carry token counts; other metric types don't
+            self.input_tokens += getattr(event.metrics, "input_tokens", 0) or 0
+            self.output_tokens += getattr(event.metrics, "output_tokens", 0) or 0
+
+    def _track(self, speaking, since, total):
+        now = time.monotonic()
+        if speaking:
+            return since if since is not None else now
+        if since is not None:
+            setattr(self, total, getattr(self, total) + now - since)
+        return None
+
+    def _speaking(self, total, since):
+        return total + (time.monotonic() - since if since is not None else 0.0)
+
+    def snapshot(self, outcome=None):
+        return {
+            "avatarSessionId": self.avatar_session_id,
+            "sessionId": self.session_id,
+            "userId": self.user_id,
+            "final": outcome is not None,
+            "outcome": outcome,
+            "durationSeconds": round(time.monotonic() - self.started_at, 1),
+            "messageCount": self.user_messages + self.avatar_responses,
+            "userMessageCount": self.user_messages,
+            "avatarResponseCount": self.avatar_responses,
+            "userSpeakingSeconds": round(self._speaking(self.user_speaking, self._user_speaking_since), 1),
+            "avatarSpeakingSeconds": round(self._speaking(self.agent_speaking, self._agent_speaking_since), 1),
+            "inputTokens": self.input_tokens,
+            "outputTokens": self.output_tokens,
+        }
+
+
+class MetricsReporter:
+    """Batches snapshots for every session in the process into one request per flush
+
+    Live sessions are sampled every flush interval; a finished session's final
+    snapshot is queued until the API accepts it. Failed flushes back off
+    exponentially and keep the newest snapshot per session for the retry.
+    A 4xx other than a rate limit is never retried: the batch is dropped, and
+    a rejected token (401/403) turns reporting off for the process.
+    """
+
+    def __init__(self, api, interval=FLUSH_INTERVAL_SECONDS):
+        self.api = api
+        self.interval = interval
+        self.token = os.getenv("AVATAR_AGENT_TOKEN", "")
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._live = {}
+        self._pending = {}
+        self._wake = threading.Event()
+        self._thread = None
+        self._failures = 0
+        self.sent = 0
+        self.dropped = 0
+        self.disabled = False
+
+    def track(self, metrics):
+        if self.disabled:
+            return
+        with self._lock:
+            self._live[metrics.avatar_session_id] = metrics
+        self._ensure_thread()
+
+    def finish(self, metrics, outcome):
+        """Queue the final snapshot for a session and stop sampling it"""
+        if self.disabled:
+            return
+        with self._lock:
+            self._live.pop(metrics.avatar_session_id, None)
+            self._pending[metrics.avatar_session_id] = metrics.snapshot(outcome)
+
+    def _ensure_thread(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="avatar-metrics-reporter", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            backoff = min(self.interval * 2 ** self._failures, MAX_BACKOFF_SECONDS)
+            self._wake.wait(backoff)
+            self._wake.clear()
+            self.flush()
+
+    def flush(self):
+        """Send everything pending plus a sample of each live session; blocking, returns True on success"""
+        with self._flush_lock:
+            with self._lock:
+                batch = dict(self._pending)
+                for avatar_session_id, metrics in self._live.items():
+                    batch.setdefault(avatar_session_id, metrics.snapshot())
+            if not batch:
+                return True
+            if self.disabled:
+                return False
+
+            try:
+                response = self.api.post_json(
+                    METRICS_PATH,
+                    {"sessions": list(batch.values())},
+                    headers={"X-Avatar-Agent-Token": self.token},
+                    timeout=REQUEST_TIMEOUT_SECONDS,
+                )
+                error = None if 200 <= response.status < 300 else f"HTTP {response.status}"
+            except Exception as e:
+                response, error = None, e
+
+            if response is not None and is_permanent_error(response.status):
+                # Sending the same batch again gets the same answer, so it is dropped rather than retried
+                self._failures = 0
+                self.dropped += len(batch)
+                self._remove_sent(batch)
+                if response.status in (401, 403):
+                    self.disabled = True
+                    with self._lock:
+                        self._live.clear()
+                        self._pending.clear()
+                    logger.error(
+                        "Conversation metrics rejected (HTTP %d, check AVATAR_AGENT_TOKEN); reporting turned off",
+                        response.status,
+                    )
+                else:
+                    logger.error("Conversation metrics rejected (HTTP %d), dropped %d sessions", response.status, len(batch))
+                return False
+            if error is not None:
+                self._failures += 1
+                logger.warning("Failed to report conversation metrics (%d sessions, attempt %d): %s", len(batch), self._failures, error)
+                return False
+
+            self._failures = 0
+            self.sent += len(batch)
+            self._remove_sent(batch)
+            return True
+
+    def _remove_sent(self, batch):
+        with self._lock:
+            for avatar_session_id, snapshot in batch.items():
+                # A newer final snapshot may have been queued while this one was in flight
+                if self._pending.get(avatar_session_id) is snapshot:
+                    del self._pending[avatar_session_id]
+
+
+metrics_reporter = MetricsReporter(api_client)
@@ -0,0 +1,423 @@
+"""
+Offline stand-ins for the Gemini realtime model and the Simli avatar
+Selected with AVATAR_FAKE_BACKENDS=1, so startup and steady-state costs can
+be measured repeatably with no Gemini or Simli account (see loadtest.py).
+Latency, jitter and throughput are configured through AVATAR_FAKE_* variables.
+
+FakeRealtimeModel is a livekit.agents RealtimeModel and FakeAvatarSession
+follows simli.AvatarSession's start(agent_session, room) contract, so the
+real entrypoint and AgentSession run against them unchanged.
+"""
+
+import asyncio
+import logging
+import math
+import os
+import random
+import struct
+import time
+from dataclasses import dataclass
+
+from livekit import rtc
+from livekit.agents import NOT_GIVEN, llm, utils
+from livekit.agents.metrics import RealtimeModelMetrics
+from livekit.agents.voice.io import AudioOutput, AudioOutputCapabilities
+
+logger = logging.getLogger("ong-avatar-agent")
+
+FRAME_MS = 20
+SAMPLE_RATE = 24000  # Gemini Live output rate
+AVATAR_SAMPLE_RATE = 16000  # What Simli's audio output asks the session for
+REPLY_TEXT = "(fake Gemini reply)"
+GENERATE_REPLY_TIMEOUT = 5.0  # Same as the Gemini plugin
+
+
+def enabled():
+    return os.getenv("AVATAR_FAKE_BACKENDS", "0") == "1"
+
+
+@dataclass(frozen=True)
+class FakeBackendProfile:
+    gemini_connect_ms: float = 800
+    gemini_first_audio_ms: float = 900
+    simli_start_ms: float = 1500
+    jitter: float = 0.25  # Uniform +/- fraction applied to every latency
+    throughput: float = 1.0  # Frames generated at N x real time; 0 means unpaced
+    reply_seconds: float = 4.0
+    video_fps: int = 30  # 0 publishes no avatar video
+    video_size: int = 512
+    gemini_failure_rate: float = 0.0
+    simli_failure_rate: float = 0.0
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            gemini_connect_ms=float(os.getenv("AVATAR_FAKE_GEMINI_CONNECT_MS", "800")),
+            gemini_first_audio_ms=float(os.getenv("AVATAR_FAKE_GEMINI_FIRST_AUDIO_MS", "900")),
+            simli_start_ms=float(os.getenv("AVATAR_FAKE_SIMLI_START_MS", "1500")),
+            jitter=float(os.getenv("AVATAR_FAKE_JITTER", "0.25")),
+            throughput=float(os.getenv("AVATAR_FAKE_THROUGHPUT", "1.0")),
+            reply_seconds=float(os.getenv("AVATAR_FAKE_REPLY_SECONDS", "4")),
+            video_fps=int(os.getenv("AVATAR_FAKE_VIDEO_FPS", "30")),
+            video_size=int(os.getenv("AVATAR_FAKE_VIDEO_SIZE", "512")),
+            gemini_failure_rate=float(os.getenv("AVATAR_FAKE_GEMINI_FAILURE_RATE", "0")),
+            simli_failure_rate=float(os.getenv("AVATAR_FAKE_SIMLI_FAILURE_RATE", "0")),
+        )
+
+    async def sleep_ms(self, mean_ms):
+        await asyncio.sleep(max(mean_ms * (1 + random.uniform(-self.jitter, self.jitter)), 0) / 1000)
+
+    def playout_seconds(self, seconds):
+        """Wall time for media of this length at the configured throughput"""
+        return seconds / self.throughput if self.throughput > 0 else 0.0
+
+
+async def paced(count, interval, throughput):
+    """Yield 0..count-1 at interval / throughput spacing, against absolute deadlines so pacing doesn't drift"""
+    step = interval / throughput if throughput > 0 else 0
+    started = time.monotonic()
+    for i in range(count):
+        delay = started + i * step - time.monotonic()
+        # Always yield to the loop, even when unpaced, so one stream can't starve the others
+        await asyncio.sleep(max(delay, 0))
+        yield i
+
+
+def _tone_pcm(samples, frequency=220.0):
+    return struct.pack(
+        f"<{samples}h",
+        *(int(8000 * math.sin(2 * math.pi * frequency * n / SAMPLE_RATE)) for n in range(samples)),
+    )
+
+
+class FakeRealtimeModel(llm.RealtimeModel):
+    """Stands in for google.beta.realtime.RealtimeModel; every reply is a synthetic tone"""
+
+    def __init__(self, *, api_key, voice, instructions, profile=None):
+        super().__init__(
+            capabilities=llm.RealtimeCapabilities(
+                message_truncation=False,
+                turn_detection=True,
+                user_transcription=False,
+                auto_tool_reply_generation=True,
+                audio_output=True,
+                manual_function_calls=False,
+            )
+        )
+        self.api_key = api_key
+        self.voice = voice
+        self.instructions = instructions
+        self.profile = profile or FakeBackendProfile.from_env()
+        self.pcm = _tone_pcm(SAMPLE_RATE * FRAME_MS // 1000)
+
+    @property
+    def model(self):
+        return "fake-gemini-live"
+
+    @property
+    def provider(self):
+        return "fake"
+
+    def session(self):
+        return FakeRealtimeSession(self)
+
+    async def aclose(self):
+        pass
+
+
+class FakeRealtimeSession(llm.RealtimeSession):
+    """One simulated Gemini Live connection
+
+    Like the Gemini plugin, it connects in the background and reports a failed
+    connect as an unrecoverable error event rather than raising.
+    """
+
+    def __init__(self, realtime_model):
+        super().__init__(realtime_model)
+        self._profile = realtime_model.profile
+        self._instructions = realtime_model.instructions
+        self._chat_ctx = llm.ChatContext.empty()
+        self._tools = llm.ToolContext.empty()
+        self._connect_error = None
+        self._connected = asyncio.Event()
+        self._pending_generation = None
+        self._generation_task = None
+        self._connect_task = asyncio.create_task(self._connect())
+
+    async def _connect(self):
+        await self._profile.sleep_ms(self._profile.gemini_connect_ms)
+        if random.random() < self._profile.gemini_failure_rate:
+            self._connect_error = ConnectionError("fake Gemini: simulated connect failure")
+            self.emit(
+                "error",
+                llm.RealtimeModelError(
+                    timestamp=time.time(),
+                    label=self._realtime_model.label,
+                    error=self._connect_error,
+                    recoverable=False,
+                ),
+            )
+        self._connected.set()
+
+    @property
+    def chat_ctx(self):
+        return self._chat_ctx.copy()
+
+    @property
+    def tools(self):
+        return self._tools.copy()
+
+    async def update_instructions(self, instructions):
+        self._instructions = instructions
+
+    async def update_chat_ctx(self, chat_ctx):
+        self._chat_ctx = chat_ctx.copy()
+
+    async def update_tools(self, tools):
+        self._tools = llm.ToolContext(tools)
+
+    def update_options(self, *, tool_choice=NOT_GIVEN):
+        pass
+
+    def push_audio(self, frame):
+        pass  # No server-side VAD: the simulated user never takes a turn
+
+    def push_video(self, frame):
+        pass
+
+    def generate_reply(self, *, instructions=NOT_GIVEN):
+        if self._pending_generation is not None and not self._pending_generation.done():
+            self._pending_generation.cancel()
+        future = asyncio.get_running_loop().create_future()
+        self._pending_generation = future
+
+        def on_timeout():
+            if not future.done():
+                future.set_exception(llm.RealtimeError("generate_reply timed out waiting for generation_created event."))
+
+        timeout = asyncio.get_running_loop().call_later(GENERATE_REPLY_TIMEOUT, on_timeout)
+        future.add_done_callback(lambda _: timeout.cancel())
+        self.interrupt()
+        self._generation_task = asyncio.create_task(self._generate(future))
+        return future
+
+    async def _generate(self, future):
+        await self._connected.wait()
+        if self._connect_error is not None:
+            if not future.done():
+                future.set_exception(llm.RealtimeError(f"fake Gemini: not connected ({self._connect_error})"))
+            return
+        created = time.time()
+        await self._profile.sleep_ms(self._profile.gemini_first_audio_ms)
+        if future.done():
+            return  # Timed out or superseded
+
+        response_id = utils.shortuuid("GR_")
+        message_ch = utils.aio.Chan()
+        text_ch = utils.aio.Chan()
+        audio_ch = utils.aio.Chan()
+        function_ch = utils.aio.Chan()
+        modalities = asyncio.get_running_loop().create_future()
+        modalities.set_result(["audio", "text"])
+        message_ch.send_nowait(
+            llm.MessageGeneration(message_id=response_id, text_stream=text_ch, audio_stream=audio_ch, modalities=modalities)
+        )
+        message_ch.close()
+        function_ch.close()
+        event = llm.GenerationCreatedEvent(
+            message_stream=message_ch, function_stream=function_ch, user_initiated=True, response_id=response_id,
+        )
+        future.set_result(event)
+        self.emit("generation_created", event)
+
+        first_audio = time.time()
+        model = self._realtime_model
+        count = int(self._profile.reply_seconds * 1000 / FRAME_MS)
+        try:
+            text_ch.send_nowait(REPLY_TEXT)
+            async for _ in paced(count, FRAME_MS / 1000, self._profile.throughput):
+                audio_ch.send_nowait(
+                    rtc.AudioFrame(
+                        data=model.pcm,
+                        sample_rate=SAMPLE_RATE,
+                        num_channels=1,
+                        samples_per_channel=len(model.pcm) // 2,
+                    )
+                )
+            cancelled = False
+        except asyncio.CancelledError:
+            cancelled = True
+        finally:
+            text_ch.close()
+            audio_ch.close()
+
+        self._chat_ctx.add_message(role="assistant", content=REPLY_TEXT, id=response_id)
+        duration = time.time() - created
+        self.emit(
+            "metrics_collected",
+            RealtimeModelMetrics(
+                label=model.label,
+                request_id=response_id,
+                timestamp=created,
+                duration=duration,
+                ttft=first_audio - created,
+                cancelled=cancelled,
+                input_tokens=0,
+                output_tokens=count,
+                total_tokens=count,
+                tokens_per_second=count / duration if duration > 0 else 0,
+                input_token_details=RealtimeModelMetrics.InputTokenDetails(
+                    audio_tokens=0, text_tokens=0, image_tokens=0, cached_tokens=0, cached_tokens_details=None,
+                ),
+                output_token_details=RealtimeModelMetrics.OutputTokenDetails(
+                    text_tokens=0, audio_tokens=count, image_tokens=0,
+                ),
+            ),
+        )
+
+    def commit_audio(self):
+        pass
+
+    def clear_audio(self):
+        pass
+
+    def interrupt(self):
+        if self._generation_task is not None and not self._generation_task.done():
+            self._generation_task.cancel()
+
+    def truncate(self, *, message_id, modalities, audio_end_ms, audio_transcript=NOT_GIVEN):
+        pass
+
+    async def aclose(self):
+        for task in (self._connect_task, self._generation_task):
+            if task is not None:
+                await utils.aio.cancel_and_wait(task)
+
+
+class FakeAvatarAudioOutput(AudioOutput):
+    """Takes over the session's audio output like Simli does, playing it out against the clock
+
+    Simli reports each segment as played once its lip-synced video has
+    caught up; here that is when the segment's duration has elapsed.
+    """
+
+    def __init__(self, profile):
+        super().__init__(
+            label="FakeAvatar",
+            capabilities=AudioOutputCapabilities(pause=False),
+            sample_rate=AVATAR_SAMPLE_RATE,
+        )
+        self.profile = profile
+        self.frames = 0
+        self.seconds = 0.0
+        self._segment_started = None
+        self._segment_seconds = 0.0
+        self._finish_handle = None
+
+    @property
+    def speaking(self):
+        return self._segment_started is not None
+
+    async def capture_frame(self, frame):
+        if self._finish_handle is not None:
+            self._finish(False)  # The next reply started before the last one finished playing out
+        await super().capture_frame(frame)
+        if self._segment_started is None:
+            self._segment_started = time.monotonic()
+            self._segment_seconds = 0.0
+        duration = frame.samples_per_channel / frame.sample_rate
+        self._segment_seconds += duration
+        self.frames += 1
+        self.seconds += duration
+
+    def flush(self):
+        super().flush()
+        if self._segment_started is None:
+            return
+        played = time.monotonic() - self._segment_started
+        remaining = max(self.profile.playout_seconds(self._segment_seconds) - played, 0.0)
+        self._finish_handle = asyncio.get_running_loop().call_later(remaining, self._finish, False)
+
+    def clear_buffer(self):
+        if self._segment_started is not None:
+            self._finish(True)
+
+    def _finish(self, interrupted):
+        if self._segment_started is None:
+            return
+        if self._finish_handle is not None:
+            self._finish_handle.cancel()
+            self._finish_handle = None
+        position = min(time.monotonic() - self._segment_started, self._segment_seconds)
+        self._segment_started = None
+        self.on_playback_finished(playback_position=position, interrupted=interrupted)
+
+
+class FakeAvatarSession:
+    """Stands in for simli.AvatarSession
+
+    Simli joins the room as its own participant and publishes the avatar
+    video from its servers. The fake publishes a synthetic video track from
+    the agent's participant instead, so clients see a video track as usual;
+    this adds an encode cost the agent doesn't pay in production, which
+    AVATAR_FAKE_VIDEO_FPS=0 leaves out.
+    """
+
+    def __init__(self, *, simli_config=None, profile=None):
+        self.simli_config = simli_config
+        self.profile = profile or FakeBackendProfile.from_env()
+        self.audio_output = FakeAvatarAudioOutput(self.profile)
+        self.video_frames = 0
+        self._room = None
+        self._video_source = None
+        self._video_publication = None
+        self._video_task = None
+
+    async def start(self, agent_session, room):
+        await self.profile.sleep_ms(self.profile.simli_start_ms)
+        if random.random() < self.profile.simli_failure_rate:
+            raise ConnectionError("fake Simli: simulated start failure")
+        self._room = room
+        if self.profile.video_fps > 0:
+            size = self.profile.video_size
+            self._video_source = rtc.VideoSource(size, size)
+            track = rtc.LocalVideoTrack.create_video_track("avatar_video", self._video_source)
+            self._video_publication = await room.local_participant.publish_track(
+                track, rtc.TrackPublishOptions(source=rtc.TrackSource.SOURCE_CAMERA)
+            )
+            self._video_task = asyncio.create_task(self._render_video())
+        agent_session.output.audio = self.audio_output
+
+    async def _render_video(self):
+        size = self.profile.video_size
+        buffer = bytearray(size * size * 4)
+        # Unbounded count; the stream runs until aclose cancels it
+        async for i in paced(2**62, 1 / self.profile.video_fps, self.profile.throughput):
+            # A moving stripe while speaking, so the picture changes like a talking face
+            if self.audio_output.speaking:
+                row = (i % size) * size * 4
+                buffer[row:row + size * 4] = bytes([i & 0xFF]) * (size * 4)
+            self._video_source.capture_frame(rtc.VideoFrame(size, size, rtc.VideoBufferType.RGBA, buffer))
+            self.video_frames += 1
+
+    def stats(self):
+        return {
+            "audio_frames": self.audio_output.frames,
+            "audio_seconds": round(self.audio_output.seconds, 2),
+            "video_frames": self.video_frames,
+        }
+
+    async def aclose(self):
+        if self._video_task is not None:
+            await utils.aio.cancel_and_wait(self._video_task)
+            self._video_task = None
+        if self._video_publication is not None:
+            try:
+                await self._room.local_participant.unpublish_track(self._video_publication.sid)
+            except Exception as e:
+                logger.debug("Fake avatar video already gone: %s", e)
+            self._video_publication = None
+        if self._video_source is not None:
+            await self._video_source.aclose()
+            self._video_source = None
+        logger.info("Fake avatar closed: %s", self.stats())
@@ -0,0 +1,160 @@
+"""
+On-disk cache of pre-generated greeting audio
+Clips are keyed by (voice, prompt hash), so changing /api/avatar/settings
+moves to a new key and clips recorded under the old settings are deleted
+on the next lookup.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import shutil
+import time
+import wave
+from dataclasses import dataclass
+
+from livekit import rtc
+
+logger = logging.getLogger("ong-avatar-agent")
+
+CACHE_DIR = os.getenv("AVATAR_GREETING_CACHE_DIR", "/tmp/ong-greeting-cache")
+# A few variants so returning users don't hear the exact same clip every time
+MAX_CLIPS_PER_KEY = int(os.getenv("AVATAR_GREETING_CACHE_CLIPS", "3"))
+MIN_CLIP_SECONDS = 1.0
+FRAME_MS = 20
+
+# Strong references to in-flight clip writes so they aren't garbage collected
+_pending_writes = set()
+
+
+def greeting_key(voice, prompt, greeting_instructions):
+    digest = hashlib.sha256(f"{prompt}\n--\n{greeting_instructions}".encode("utf-8")).hexdigest()[:16]
+    return f"{voice}-{digest}"
+
+
+@dataclass
+class GreetingClip:
+    text: str
+    path: str
+    sample_rate: int
+    num_channels: int
+
+    async def frames(self):
+        """Replay the clip as 20ms audio frames"""
+        pcm = await asyncio.to_thread(self._read_pcm)
+        samples_per_frame = self.sample_rate * FRAME_MS // 1000
+        bytes_per_frame = samples_per_frame * self.num_channels * 2
+        for offset in range(0, len(pcm), bytes_per_frame):
+            chunk = pcm[offset:offset + bytes_per_frame]
+            yield rtc.AudioFrame(
+                data=chunk,
+                sample_rate=self.sample_rate,
+                num_channels=self.num_channels,
+                samples_per_channel=len(chunk) // (2 * self.num_channels),
+            )
+
+    def _read_pcm(self):
+        with wave.open(self.path, "rb") as wav:
+            return wav.readframes(wav.getnframes())
+
+
+class GreetingRecorder:
+    """Copies the frames of one reply as they pass through the session's audio output"""
+
+    def __init__(self, audio_output):
+        self.audio_output = audio_output
+        self.frames = []
+        self._original = None
+
+    def __enter__(self):
+        # Patch the instance rather than replacing the output, so Simli's lip-sync path is untouched
+        self._original = self.audio_output.capture_frame
+
+        async def capture_frame(frame):
+            self.frames.append(frame)
+            await self._original(frame)
+
+        self.audio_output.capture_frame = capture_frame
+        return self
+
+    def __exit__(self, *exc):
+        del self.audio_output.capture_frame  # Drop the instance override
+
+    @property
+    def duration(self):
+        return sum(f.samples_per_channel / f.sample_rate for f in self.frames)
+
+
+class GreetingCache:
+    def __init__(self, root=CACHE_DIR, max_clips=MAX_CLIPS_PER_KEY):
+        self.root = root
+        self.max_clips = max_clips
+
+    @staticmethod
+    def enabled():
+        return os.getenv("AVATAR_GREETING_CACHE", "0") == "1"
+
+    def _key_dir(self, key):
+        return os.path.join(self.root, key)
+
+    def _invalidate_others(self, key):
+        """Remove clips recorded under any other settings"""
+        if not os.path.isdir(self.root):
+            return
+        for name in os.listdir(self.root):
+            if name != key:
+                shutil.rmtree(os.path.join(self.root, name), ignore_errors=True)
+                logger.info("Greeting cache invalidated: %s", name)
+
+    def _load_clips(self, key):
+        key_dir = self._key_dir(key)
+        if not os.path.isdir(key_dir):
+            return []
+        clips = []
+        for name in sorted(os.listdir(key_dir)):
+            if not name.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(key_dir, name)) as f:
+                    meta = json.load(f)
+                clips.append(GreetingClip(path=os.path.join(key_dir, meta["file"]), **meta["audio"], text=meta["text"]))
+            except (OSError, ValueError, KeyError, TypeError):
+                continue
+        return clips
+
+    def lookup(self, key):
+        """Cached clips for this key; also drops clips recorded under older settings"""
+        self._invalidate_others(key)
+        return self._load_clips(key)
+
+    def store_in_background(self, key, text, frames):
+        task = asyncio.create_task(asyncio.to_thread(self.store, key, text, frames))
+        _pending_writes.add(task)
+        task.add_done_callback(_pending_writes.discard)
+
+    def store(self, key, text, frames):
+        """Write a recorded greeting; runs in a worker thread"""
+        if not frames or not text:
+            return
+        key_dir = self._key_dir(key)
+        os.makedirs(key_dir, exist_ok=True)
+        clip_id = f"{int(time.time() * 1000)}-{os.getpid()}"
+        wav_path = os.path.join(key_dir, f"{clip_id}.wav")
+        sample_rate, num_channels = frames[0].sample_rate, frames[0].num_channels
+
+        with wave.open(wav_path, "wb") as wav:
+            wav.setnchannels(num_channels)
+            wav.setsampwidth(2)
+            wav.setframerate(sample_rate)
+            for frame in frames:
+                wav.writeframes(bytes(frame.data))
+
+        # Metadata is written last, so a clip is only visible once its audio is complete
+        meta = {"file": f"{clip_id}.wav", "text": text, "audio": {"sample_rate": sample_rate, "num_channels": num_channels}}
+        tmp_path = os.path.join(key_dir, f"{clip_id}.json.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, os.path.join(key_dir, f"{clip_id}.json"))
+        logger.info("Greeting cache stored clip %s for %s", clip_id, key)
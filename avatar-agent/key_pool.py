@@ -0,0 +1,200 @@
+"""
+Health-aware Gemini API key pool for the avatar agent
+
+Tracks in-flight sessions per key and cools a key down after quota (429)
+errors. State lives in a small JSON file guarded by an flock, so every job
+process on the host sees the same counts. Keys are stored by fingerprint,
+never in plain text.
+"""
+
+import hashlib
+import logging
+import os
+import time
+import uuid
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+from shared_state import locked_json, pid_alive
+
+logger = logging.getLogger("ong-avatar-agent")
+
+STATE_FILE = os.getenv("AVATAR_KEY_POOL_STATE", "/tmp/ong-avatar-key-pool.json")
+COOLDOWN_SECONDS = float(os.getenv("AVATAR_GEMINI_KEY_COOLDOWN", "60"))
+# Honour the server's key choice unless it carries this many more sessions than the idlest key
+MAX_IMBALANCE = 2
+
+QUOTA_STATUS_CODE = 429
+QUOTA_STATUS = "RESOURCE_EXHAUSTED"
+# Gemini Live reports an exhausted quota by closing the socket with 1011 and a reason saying so
+LIVE_CLOSE_CODE = 1011
+LIVE_QUOTA_REASONS = ("resource_exhausted", "exceeded your current quota")
+
+
+def fingerprint(key):
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:12]
+
+
+def _error_chain(error):
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        yield error
+        error = error.__cause__ or error.__context__
+
+
+def is_quota_error(error):
+    """True for a rate-limit/quota failure: HTTP 429, a RESOURCE_EXHAUSTED status, or Live's quota close
+
+    Looks at the status fields google-genai (APIError.code/.status) and HTTP
+    clients (.status_code/.status) attach, anywhere in the exception chain,
+    rather than at the message text.
+    """
+    for cause in _error_chain(error):
+        code = getattr(cause, "code", None)
+        if code is None:
+            code = getattr(cause, "status_code", None)
+        status = getattr(cause, "status", None)
+        if code == QUOTA_STATUS_CODE or status == QUOTA_STATUS_CODE:
+            return True
+        if isinstance(status, str) and status.upper() == QUOTA_STATUS:
+            return True
+        # A Live close frame carries only the close code and its reason (kept in APIError.details)
+        reason = getattr(cause, "details", None)
+        if code == LIVE_CLOSE_CODE and isinstance(reason, str):
+            reason = reason.lower()
+            if any(marker in reason for marker in LIVE_QUOTA_REASONS):
+                return True
+    return False
+
+
+@dataclass(frozen=True)
+class KeyLease:
+    index: int
+    key: str
+    lease_id: str
+
+    @property
+    def fingerprint(self):
+        return fingerprint(self.key)
+
+
+class KeyPool:
+    """Gemini keys in the same order the server indexes them (configured keys only)"""
+
+    def __init__(self, keys, state_file=STATE_FILE, cooldown_seconds=COOLDOWN_SECONDS):
+        self.keys = list(keys)
+        self.state_file = state_file
+        self.cooldown_seconds = cooldown_seconds
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(config.ordered_gemini_keys)
+
+    @contextmanager
+    def _locked_state(self):
+        """Read-modify-write the shared state under an exclusive lock"""
+        with locked_json(self.state_file) as state:
+            self._prune(state)
+            yield state
+
+    @staticmethod
+    def _prune(state):
+        """Drop leases held by processes that died without releasing them"""
+        for entry in state.values():
+            leases = entry.get("leases", {})
+            for lease_id, pid in list(leases.items()):
+                if not pid_alive(pid):
+                    del leases[lease_id]
+
+    def _entry(self, state, key):
+        return state.setdefault(fingerprint(key), {"leases": {}, "cooldown_until": 0})
+
+    def _choose(self, state, preferred_index, exclude=()):
+        now = time.time()
+        candidates = []
+        for index, key in enumerate(self.keys):
+            if index in exclude:
+                continue
+            entry = self._entry(state, key)
+            cooling = entry["cooldown_until"] > now
+            candidates.append((cooling, len(entry["leases"]), entry["cooldown_until"], index))
+        if not candidates:
+            return None
+
+        healthy = [c for c in candidates if not c[0]]
+        if not healthy:
+            # Everything is cooling down - use the key that recovers first
+            return min(candidates, key=lambda c: c[2])[3]
+
+        least_loaded = min(healthy, key=lambda c: (c[1], c[3]))
+        for cooling, in_flight, _, index in healthy:
+            if index == preferred_index and in_flight - least_loaded[1] < MAX_IMBALANCE:
+                return index
+        return least_loaded[3]
+
+    def _lease(self, state, index):
+        lease = KeyLease(index, self.keys[index], uuid.uuid4().hex)
+        self._entry(state, lease.key)["leases"][lease.lease_id] = os.getpid()
+        return lease
+
+    def acquire(self, preferred_index=None):
+        """Lease a key for one session, or None when no key is configured"""
+        if not self.keys:
+            return None
+        if not isinstance(preferred_index, int) or not 0 <= preferred_index < len(self.keys):
+            preferred_index = None
+
+        with self._locked_state() as state:
+            index = self._choose(state, preferred_index)
+            lease = self._lease(state, index)
+            in_flight = len(self._entry(state, lease.key)["leases"])
+
+        if preferred_index is not None and index != preferred_index:
+            logger.info("Gemini key index %s is unhealthy or overloaded, using index %d", preferred_index, index)
+        logger.info("Leased Gemini key index %d (%s, %d in flight)", index, lease.fingerprint, in_flight)
+        return lease
+
+    def release(self, lease):
+        if lease is None:
+            return
+        with self._locked_state() as state:
+            self._entry(state, lease.key)["leases"].pop(lease.lease_id, None)
+
+    def fail_over(self, lease, error):
+        """Cool down a key after a quota error and lease a different healthy key
+
+        Returns the new lease, or None (keeping the current lease) when no
+        other key is available.
+        """
+        with self._locked_state() as state:
+            entry = self._entry(state, lease.key)
+            entry["cooldown_until"] = time.time() + self.cooldown_seconds
+            index = self._choose(state, None, exclude={lease.index})
+            if index is None or self._entry(state, self.keys[index])["cooldown_until"] > time.time():
+                new_lease = None
+            else:
+                entry["leases"].pop(lease.lease_id, None)
+                new_lease = self._lease(state, index)
+
+        logger.warning(
+            "Gemini key index %d (%s) cooling down for %.0fs after: %s",
+            lease.index, lease.fingerprint, self.cooldown_seconds, error,
+        )
+        if new_lease is not None:
+            logger.info("Failing over to Gemini key index %d (%s)", new_lease.index, new_lease.fingerprint)
+        return new_lease
+
+    def status(self):
+        """Per-key in-flight count and remaining cooldown, for logs"""
+        now = time.time()
+        with self._locked_state() as state:
+            return [
+                {
+                    "index": index,
+                    "key": fingerprint(key),
+                    "in_flight": len(self._entry(state, key)["leases"]),
+                    "cooldown": max(0, round(self._entry(state, key)["cooldown_until"] - now)),
+                }
+                for index, key in enumerate(self.keys)
+            ]
@@ -0,0 +1,413 @@
+#!/usr/bin/env python3
+"""
+Load-test harness for the Ong avatar agent
+
+Drives agent.py's entrypoint for N simulated "Talk to Ong" rooms with the
+real AgentSession and the AVATAR_FAKE_BACKENDS stand-ins for Gemini and Simli
+(see fake_backends), then reports throughput, startup-latency percentiles,
+memory per session and failure rate. The real Gemini and Simli plugins are
+imported, so memory includes them as in production.
+
+The LiveKit room is the one local stand-in, since there is no server here:
+the session runs without RoomIO and plays its audio out against the clock.
+To include RoomIO and the SFU, run agent.py itself with AVATAR_FAKE_BACKENDS=1
+against a LiveKit dev server.
+
+    python3 loadtest.py --rooms 50 --concurrency 10 --hold 5 --mode thread
+    python3 loadtest.py --rooms 20 --concurrency 10 --mode process
+
+--mode thread runs every room in this process on its own thread and event
+loop, like AVATAR_JOB_EXECUTOR=thread; --mode process gives each room its
+own process, like the default process executor. Comparing the two gives
+memory per session and sessions per core for each model. Memory is measured
+the same way in both: peak proportional set size (PSS, shared pages split
+between the processes mapping them) of the processes hosting rooms, divided
+by the rooms they hosted at once.
+"""
+
+import argparse
+import asyncio
+import collections
+import concurrent.futures
+import dataclasses
+import functools
+import json
+import multiprocessing
+import os
+import random
+import resource
+import socket
+import sys
+import tempfile
+import threading
+import time
+import types
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+@dataclasses.dataclass
+class Profile:
+    """Simulated LiveKit timings in seconds (mean, +/- uniform jitter)
+
+    Gemini and Simli timings come from fake_backends' AVATAR_FAKE_* settings.
+    hold is how long the simulated user stays before leaving.
+    """
+
+    connect: float = 0.15
+    hold: float = 5.0
+    jitter: float = 0.25
+
+    def delay(self, mean):
+        return max(mean * (1 + random.uniform(-self.jitter, self.jitter)), 0.0)
+
+
+# ---------------------------------------------------------------------------
+# Local stand-in for the LiveKit room (Gemini and Simli come from fake_backends)
+# ---------------------------------------------------------------------------
+
+
+class FakeParticipant:
+    def __init__(self, identity, kind, attributes=None):
+        self.identity = identity
+        self.kind = kind
+        self.attributes = attributes or {}
+
+
+class FakeLocalParticipant:
+    def __init__(self):
+        self.published = []
+        self.tracks = {}
+
+    async def publish_data(self, payload, *, reliable=True, topic=""):
+        self.published.append((topic, payload))
+
+    async def publish_track(self, track, options=None):
+        publication = types.SimpleNamespace(sid=f"TR_{len(self.tracks)}", track=track)
+        self.tracks[publication.sid] = publication
+        return publication
+
+    async def unpublish_track(self, sid):
+        self.tracks.pop(sid, None)
+
+
+class FakeRoom:
+    def __init__(self, name, metadata):
+        self.name = name
+        self.metadata = metadata
+        self.remote_participants = {}
+        self.local_participant = FakeLocalParticipant()
+        self._handlers = collections.defaultdict(list)
+
+    def on(self, event, callback):
+        self._handlers[event].append(callback)
+
+    def off(self, event, callback):
+        self._handlers[event].remove(callback)
+
+    def join(self, participant):
+        self.remote_participants[participant.identity] = participant
+
+
+class FakeJobContext:
+    def __init__(self, room_name, metadata, proc, profile):
+        self.job = types.SimpleNamespace(
+            id=f"job-{room_name}",
+            room=types.SimpleNamespace(name=room_name, metadata=metadata),
+        )
+        self.proc = proc
+        self.room = FakeRoom(room_name, metadata)
+        self.profile = profile
+        self.shutdown_reason = None
+        self._shutdown_callbacks = []
+
+    def add_shutdown_callback(self, callback):
+        self._shutdown_callbacks.append(callback)
+
+    async def connect(self):
+        from livekit import rtc
+
+        await asyncio.sleep(self.profile.delay(self.profile.connect))
+        self.room.join(FakeParticipant("user", rtc.ParticipantKind.PARTICIPANT_KIND_STANDARD))
+
+    def shutdown(self, reason=""):
+        self.shutdown_reason = reason
+
+    async def run_shutdown_callbacks(self):
+        for callback in self._shutdown_callbacks:
+            await callback()
+
+
+def roomless_session_class():
+    """The real AgentSession, minus RoomIO, which needs a LiveKit server"""
+    import fake_backends
+    from livekit.agents import AgentSession
+
+    class RoomlessAgentSession(AgentSession):
+        def __init__(self, *, profile, **kwargs):
+            super().__init__(**kwargs)
+            self.profile = profile
+            self._leave = None
+
+        async def start(self, agent, room=None, room_output_options=None, **kwargs):
+            if self.output.audio is None and room_output_options is not None and room_output_options.audio_enabled:
+                # Voice only: stands in for the room audio track RoomIO would publish
+                self.output.audio = fake_backends.FakeAvatarAudioOutput(fake_backends.FakeBackendProfile.from_env())
+            await super().start(agent=agent, **kwargs)
+            # The simulated user talks for a while, then leaves
+            self._leave = asyncio.get_running_loop().call_later(self.profile.delay(self.profile.hold), self.shutdown)
+
+        async def aclose(self):
+            if self._leave is not None:
+                self._leave.cancel()
+            await super().aclose()
+
+    return RoomlessAgentSession
+
+
+# ---------------------------------------------------------------------------
+# Harness
+# ---------------------------------------------------------------------------
+
+
+def pss_mb():
+    """This process's proportional set size in MB (Linux), else its resident set size"""
+    try:
+        with open("/proc/self/smaps_rollup") as f:
+            for line in f:
+                if line.startswith("Pss:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # Peak RSS (Linux units: KB)
+
+
+class PeakMemory:
+    """Samples pss_mb() on a thread while the block runs and keeps the peak"""
+
+    def __init__(self, interval=0.1):
+        self.interval = interval
+        self.peak_mb = 0.0
+        self._stop = threading.Event()
+
+    def _sample(self):
+        while True:
+            self.peak_mb = max(self.peak_mb, pss_mb())
+            if self._stop.wait(self.interval):
+                return
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+def configure_env(api_port, workdir):
+    """Point the agent at the local stand-ins; must run before agent is imported"""
+    os.environ["API_BASE_URL"] = f"http://127.0.0.1:{api_port}"
+    os.environ["AVATAR_METRICS_FILE"] = os.path.join(workdir, "metrics.jsonl")
+    os.environ["AVATAR_KEY_POOL_STATE"] = os.path.join(workdir, "key-pool.json")
+    os.environ["AVATAR_CIRCUIT_STATE"] = os.path.join(workdir, "circuits.json")
+    os.environ["AVATAR_FAKE_BACKENDS"] = "1"
+    os.environ.setdefault("SIMLI_API_KEY", "loadtest-simli")
+    os.environ.setdefault("SIMLI_FACE_ID", "loadtest-face")
+    for i in range(1, 4):
+        os.environ.setdefault(f"GEMINI_API_KEY_{i}", f"loadtest-gemini-{i}")
+    sys.path.insert(0, HERE)
+
+
+async def start_fake_room_audio(session, room):
+    """With no avatar, the session's audio goes to the room; here it is played out against the clock"""
+    import fake_backends
+
+    session.output.audio = fake_backends.FakeAvatarAudioOutput(fake_backends.FakeBackendProfile.from_env())
+    return None
+
+
+def install_fakes(profile):
+    """Import agent and swap the room-bound parts of its session for the local stand-ins
+
+    AVATAR_FAKE_BACKENDS (set by configure_env) makes agent.py build the fake
+    Gemini model and Simli avatar itself.
+    """
+    import agent
+
+    # Plugins are imported as in production (for their memory); only the fakes are ever built
+    agent.load_plugins()
+    agent.AgentSession = functools.partial(roomless_session_class(), profile=profile)
+    agent.start_room_audio = start_fake_room_audio
+    return agent
+
+
+async def run_room(agent, index, profile, userdata):
+    session_id = f"avatar_loadtest{index}_{int(time.time() * 1000)}"
+    metadata = json.dumps({
+        "geminiKeyIndex": index % 3,
+        "sessionId": session_id,
+        "userId": f"loadtest{index}",
+        "avatarSessionId": f"loadtest-{index}",
+    })
+    proc = types.SimpleNamespace(userdata=userdata)
+    ctx = FakeJobContext(f"ong-room-loadtest{index}", metadata, proc, profile)
+    try:
+        await agent.entrypoint(ctx)
+    finally:
+        await ctx.run_shutdown_callbacks()
+
+
+def prewarmed_userdata(agent):
+    proc = types.SimpleNamespace(userdata={})
+    agent.prewarm(proc)
+    return proc.userdata
+
+
+async def run_threads(args, profile):
+    """Every room in this process on its own thread and event loop, like the thread executor"""
+    agent = install_fakes(profile)
+    # prewarm's settings prefetch blocks, and the settings stand-in is served from this loop
+    userdata = await asyncio.to_thread(prewarmed_userdata, agent)
+    loop = asyncio.get_running_loop()
+
+    def one(i):
+        asyncio.run(run_room(agent, i, profile, dict(userdata)))
+
+    with PeakMemory() as memory, concurrent.futures.ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        await asyncio.gather(*(loop.run_in_executor(pool, one, i) for i in range(args.rooms)))
+    # The whole process (interpreter and plugins included) is what these rooms cost together
+    return memory.peak_mb / min(args.concurrency, args.rooms)
+
+
+def _process_room(payload):
+    """Pool worker: one room in a fresh process, like the LiveKit process executor"""
+    index, profile_fields, api_port, workdir = payload
+    configure_env(api_port, workdir)
+    profile = Profile(**profile_fields)
+    agent = install_fakes(profile)
+    userdata = prewarmed_userdata(agent)
+    with PeakMemory() as memory:
+        asyncio.run(run_room(agent, index, profile, userdata))
+    return memory.peak_mb
+
+
+async def run_processes(args, profile, api_port, workdir):
+    context = multiprocessing.get_context("spawn")
+    payloads = [(i, dataclasses.asdict(profile), api_port, workdir) for i in range(args.rooms)]
+    with context.Pool(processes=args.concurrency, maxtasksperchild=1) as pool:
+        rss_mb = await asyncio.get_running_loop().run_in_executor(None, pool.map, _process_room, payloads)
+    return sum(rss_mb) / len(rss_mb)
+
+
+async def start_settings_api():
+    """Local stand-ins for GET /api/avatar/settings and the agent metrics endpoint"""
+    from aiohttp import web
+
+    async def settings(request):
+        return web.json_response({"voice": "Charon", "prompt": "You are Ong (load test persona)."})
+
+    app = web.Application()
+    async def metrics(request):
+        return web.json_response({"success": True})
+
+    app.router.add_get("/api/avatar/settings", settings)
+    app.router.add_post("/api/avatar/agent/metrics", metrics)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    await web.TCPSite(runner, "127.0.0.1", port).start()
+    return runner, port
+
+
+def percentile(values, pct):
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * pct / 100), len(ordered) - 1)]
+
+
+def report(args, records, wall, cpu_seconds, memory_mb):
+    sessions = [r for r in records if r.get("type") == "avatar_session"]
+    failures = [r for r in sessions if r.get("outcome") != "ok"]
+    first_audio = [r["marks_ms"]["first_audio"] for r in sessions if "first_audio" in r["marks_ms"]]
+    stages = collections.defaultdict(list)
+    for r in sessions:
+        for stage, ms in r["stages_ms"].items():
+            stages[stage].append(ms)
+
+    cores_used = cpu_seconds / wall if wall else 0.0
+    concurrent = min(args.concurrency, args.rooms)
+
+    print(f"\nmode={args.mode} rooms={args.rooms} concurrency={args.concurrency} hold={args.hold}s")
+    print(f"  completed        {len(sessions)} in {wall:.1f}s ({len(sessions) / wall:.2f} sessions/s)")
+    print(f"  failure rate     {len(failures) / max(len(sessions), 1):.1%}")
+    print(
+        f"  first audio      p50={percentile(first_audio, 50):.0f}ms "
+        f"p90={percentile(first_audio, 90):.0f}ms p99={percentile(first_audio, 99):.0f}ms"
+    )
+    for stage, values in stages.items():
+        print(f"    {stage:<14} p50={percentile(values, 50):.0f}ms p90={percentile(values, 90):.0f}ms")
+    print(f"  memory/session   {memory_mb:.1f}MB (peak PSS per concurrent room)")
+    print(f"  cpu              {cpu_seconds:.1f}s ({cores_used:.2f} cores)")
+    if cores_used:
+        print(f"  sessions/core    {concurrent / cores_used:.1f}")
+
+
+def cpu_seconds():
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime
+
+
+async def main(args):
+    profile = Profile(hold=args.hold, jitter=args.jitter)
+    # Backend timings reach the fakes (and spawned room processes) through the environment
+    for name, value in (
+        ("AVATAR_FAKE_SIMLI_START_MS", args.simli_start_ms),
+        ("AVATAR_FAKE_GEMINI_CONNECT_MS", args.gemini_connect_ms),
+        ("AVATAR_FAKE_GEMINI_FIRST_AUDIO_MS", args.first_audio_ms),
+        ("AVATAR_FAKE_JITTER", args.jitter),
+        ("AVATAR_FAKE_THROUGHPUT", args.throughput),
+        ("AVATAR_FAKE_SIMLI_FAILURE_RATE", args.simli_failure_rate),
+        ("AVATAR_FAKE_GEMINI_FAILURE_RATE", args.gemini_failure_rate),
+    ):
+        os.environ[name] = str(value)
+    workdir = tempfile.mkdtemp(prefix="ong-loadtest-")
+    runner, api_port = await start_settings_api()
+    configure_env(api_port, workdir)
+
+    cpu_before = cpu_seconds()
+    started = time.monotonic()
+    try:
+        if args.mode == "process":
+            memory_mb = await run_processes(args, profile, api_port, workdir)
+        else:
+            memory_mb = await run_threads(args, profile)
+    finally:
+        await runner.cleanup()
+    wall = time.monotonic() - started
+
+    with open(os.environ["AVATAR_METRICS_FILE"]) as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    report(args, records, wall, cpu_seconds() - cpu_before, memory_mb)
+    print(f"  records          {os.environ['AVATAR_METRICS_FILE']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rooms", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--mode", choices=["thread", "process"], default="thread")
+    parser.add_argument("--hold", type=float, default=5.0, help="simulated conversation length (s)")
+    parser.add_argument("--simli-start-ms", type=float, default=1500)
+    parser.add_argument("--gemini-connect-ms", type=float, default=800)
+    parser.add_argument("--first-audio-ms", type=float, default=900)
+    parser.add_argument("--throughput", type=float, default=1.0, help="fake media speed vs real time (0: unpaced)")
+    parser.add_argument("--jitter", type=float, default=0.25, help="uniform +/- fraction of each delay")
+    parser.add_argument("--simli-failure-rate", type=float, default=0.0)
+    parser.add_argument("--gemini-failure-rate", type=float, default=0.0)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,130 @@
+"""
+Event-loop lag monitor for avatar job processes
+
+A heartbeat task measures how late the loop wakes up. A watchdog thread
+notices when the heartbeat stops and samples the loop thread's stack while
+it is blocked, so the log shows what held the loop rather than just that
+it was held. While lag stays above the threshold, asyncio's slow-callback
+warnings are switched on as well.
+"""
+
+import asyncio
+import collections
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+
+logger = logging.getLogger("ong-avatar-agent")
+
+HEARTBEAT_INTERVAL = 0.05
+# Keep slow-callback detection on for this long after the last laggy sample
+DEBUG_COOLDOWN_SECONDS = 30.0
+MAX_STACK_DEPTH = 12
+
+
+class LoopMonitor:
+    def __init__(self, threshold_ms=100.0, sample_interval_ms=20.0):
+        self.threshold = threshold_ms / 1000
+        self.sample_interval = sample_interval_ms / 1000
+        self.max_lag_ms = 0.0
+        self.stalls = 0
+        self.stalled_ms = 0.0
+        self._loop = None
+        self._loop_thread_id = None
+        self._heartbeat = time.monotonic()
+        self._task = None
+        self._watchdog = None
+        self._stopped = threading.Event()
+        self._debug_until = 0.0
+        self._stacks = collections.Counter()
+
+    @classmethod
+    def from_env(cls):
+        return cls(threshold_ms=float(os.getenv("AVATAR_LOOP_LAG_THRESHOLD_MS", "100")))
+
+    @staticmethod
+    def enabled():
+        return os.getenv("AVATAR_LOOP_MONITOR", "1") != "0"
+
+    def start(self):
+        """Start monitoring the running loop (call from inside it)"""
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._task = asyncio.create_task(self._beat())
+        self._watchdog = threading.Thread(target=self._watch, name="loop-monitor", daemon=True)
+        self._watchdog.start()
+
+    async def aclose(self):
+        self._stopped.set()
+        if self._task is not None:
+            self._task.cancel()
+        self._set_debug(False)
+
+    def summary(self):
+        return {
+            "max_lag_ms": round(self.max_lag_ms, 1),
+            "stalls": self.stalls,
+            "stalled_ms": round(self.stalled_ms, 1),
+        }
+
+    async def _beat(self):
+        while True:
+            expected = time.monotonic() + HEARTBEAT_INTERVAL
+            await asyncio.sleep(HEARTBEAT_INTERVAL)
+            now = time.monotonic()
+            self._heartbeat = now
+            lag = max(now - expected, 0.0)
+            self.max_lag_ms = max(self.max_lag_ms, lag * 1000)
+            if lag >= self.threshold:
+                self._debug_until = now + DEBUG_COOLDOWN_SECONDS
+                self._set_debug(True)
+            elif self._loop.get_debug() and now > self._debug_until:
+                self._set_debug(False)
+
+    def _set_debug(self, enabled):
+        if self._loop is None or self._loop.get_debug() == enabled:
+            return
+        if enabled:
+            # asyncio then logs every callback that runs longer than the threshold
+            self._loop.slow_callback_duration = self.threshold
+            logger.warning("Event loop lagging, enabling slow-callback detection (>%.0fms)", self.threshold * 1000)
+        self._loop.set_debug(enabled)
+
+    def _sample_stack(self):
+        frame = sys._current_frames().get(self._loop_thread_id)
+        if frame is None:
+            return None
+        frames = traceback.extract_stack(frame)[-MAX_STACK_DEPTH:]
+        return "".join(traceback.format_list(frames))
+
+    def _watch(self):
+        """Watchdog thread: samples the loop thread's stack while the heartbeat is stalled"""
+        stall_started = None
+        while not self._stopped.wait(self.sample_interval):
+            blocked_for = time.monotonic() - self._heartbeat - HEARTBEAT_INTERVAL
+            if blocked_for >= self.threshold:
+                if stall_started is None:
+                    stall_started = self._heartbeat + HEARTBEAT_INTERVAL
+                    self._stacks.clear()
+                stack = self._sample_stack()
+                if stack:
+                    self._stacks[stack] += 1
+            elif stall_started is not None:
+                self._report_stall(time.monotonic() - stall_started)
+                stall_started = None
+
+    def _report_stall(self, duration):
+        self.stalls += 1
+        self.stalled_ms += duration * 1000
+        if not self._stacks:
+            return
+        stack, samples = self._stacks.most_common(1)[0]
+        total = sum(self._stacks.values())
+        logger.warning(
+            "Event loop blocked for %.0fms; %d/%d stack samples were in:\n%s",
+            duration * 1000, samples, total, stack,
+        )
@@ -0,0 +1,105 @@
+"""
+Session-close watchdog for avatar rooms
+Ends a session once the human has left the room, or stopped talking, for
+longer than the configured window, so an orphaned room doesn't keep the
+Gemini and Simli streams (and their bill) running.
+"""
+
+import asyncio
+import logging
+import os
+import time
+
+from livekit import rtc
+
+logger = logging.getLogger("ong-avatar-agent")
+
+CHECK_INTERVAL = 5.0
+
+
+def _is_human(participant):
+    # The Simli avatar joins as an agent participant publishing on our behalf
+    if participant.kind == rtc.ParticipantKind.PARTICIPANT_KIND_AGENT:
+        return False
+    return not participant.attributes.get("lk.publish_on_behalf")
+
+
+class SessionWatchdog:
+    def __init__(self, room, on_expire, absent_timeout=30.0, silence_timeout=300.0, max_session_length=3600):
+        self.room = room
+        self.on_expire = on_expire
+        self.absent_timeout = absent_timeout
+        self.silence_timeout = silence_timeout
+        self.max_session_length = max_session_length
+        self.started_at = time.monotonic()
+        self.last_present = self.started_at
+        self.last_activity = self.started_at
+        self.expired_reason = None
+        self.reclaimed_minutes = 0.0
+        self._task = None
+
+    @classmethod
+    def from_env(cls, room, on_expire, max_session_length):
+        return cls(
+            room,
+            on_expire,
+            absent_timeout=float(os.getenv("AVATAR_ABSENT_TIMEOUT", "30")),
+            silence_timeout=float(os.getenv("AVATAR_SILENCE_TIMEOUT", "300")),
+            max_session_length=max_session_length,
+        )
+
+    def attach(self, session):
+        """Count the user's speech as activity"""
+
+        @session.on("user_state_changed")
+        def on_user_state_changed(event):
+            if event.new_state == "speaking":
+                self.touch()
+
+        @session.on("user_input_transcribed")
+        def on_user_input_transcribed(event):
+            self.touch()
+
+    def touch(self):
+        self.last_activity = time.monotonic()
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def aclose(self):
+        if self._task is not None:
+            self._task.cancel()
+
+    def _human_present(self):
+        return any(_is_human(p) for p in self.room.remote_participants.values())
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(CHECK_INTERVAL)
+            now = time.monotonic()
+            if self._human_present():
+                self.last_present = now
+
+            if now - self.last_present >= self.absent_timeout:
+                self._expire("absent", now - self.last_present)
+                return
+            if now - self.last_activity >= self.silence_timeout:
+                self._expire("silent", now - self.last_activity)
+                return
+
+    def _expire(self, reason, idle_for):
+        elapsed = time.monotonic() - self.started_at
+        # Upper bound on what the orphaned streams could still have used before max_session_length
+        self.reclaimed_minutes = max(self.max_session_length - elapsed, 0.0) / 60
+        self.expired_reason = reason
+        logger.info(
+            "Watchdog ending session in room %s: user %s for %.0fs; reclaimed up to %.1f session-minutes",
+            self.room.name, reason, idle_for, self.reclaimed_minutes,
+        )
+        self.on_expire()
+
+    def summary(self):
+        return {
+            "expired": self.expired_reason,
+            "reclaimed_minutes": round(self.reclaimed_minutes, 1),
+        }
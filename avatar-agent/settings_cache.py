@@ -0,0 +1,193 @@
+"""
+Process-wide avatar persona settings, kept current by one background watcher
+Rooms read settings from memory (no per-room fetch), and live sessions are
+told when an admin changes the persona or voice
+"""
+
+import asyncio
+import logging
+import os
+import threading
+import time
+
+from api_client import api_client, is_permanent_error
+
+logger = logging.getLogger("ong-avatar-agent")
+
+# Default instructions (fallback if API is unavailable)
+DEFAULT_INSTRUCTIONS = """You are Ong, a friendly AI companion for the Mien Kingdom community.
+
+Your role:
+- Help users learn about Mien culture, traditions, and history
+- Assist with Mien language translation and pronunciation
+- Share knowledge about Mien cuisine, clothing, and customs
+- Be warm, patient, and encouraging with users of all ages
+- Speak naturally and conversationally, like a wise friend
+
+Guidelines:
+- Keep responses concise and conversational (1-3 sentences typically)
+- Use simple, clear language
+- Be respectful of Mien cultural traditions
+- If you don't know something about Mien culture, admit it honestly
+- Encourage users to explore and learn more about their heritage
+
+Remember: You represent the Mien Kingdom community - be welcoming and inclusive!
+"""
+
+DEFAULT_VOICE = "Charon"
+
+SETTINGS_PATH = "/api/avatar/settings"
+FETCH_TIMEOUT_SECONDS = 5
+
+
+def default_settings():
+    return {
+        "voice": DEFAULT_VOICE,
+        "prompt": DEFAULT_INSTRUCTIONS,
+    }
+
+
+def _parse_settings(data):
+    return {
+        "voice": data.get("voice") or DEFAULT_VOICE,
+        "prompt": data.get("prompt") or DEFAULT_INSTRUCTIONS,
+    }
+
+
+class SettingsCache:
+    """Current settings plus a conditional-GET (ETag) watcher thread
+
+    The watcher polls /api/avatar/settings with If-None-Match, so an unchanged
+    persona costs a 304 with no body. It is a thread rather than a task because
+    in thread executor mode each room has its own event loop and none of them
+    outlives the process. Subscribers are called on their own loop. A 4xx other
+    than a rate limit won't heal by polling again, so it stops the watcher and
+    rooms keep the last settings fetched (or the defaults).
+    """
+
+    def __init__(self, api, poll_interval=15.0):
+        self.api = api
+        self.poll_interval = poll_interval
+        self._value = None
+        self._etag = None
+        self._checked_at = None
+        self._lock = threading.Lock()
+        self._subscribers = set()
+        self._watcher = None
+        self.stopped = False
+        self.polls = 0
+        self.changes = 0
+        self.failures = 0
+
+    @classmethod
+    def from_env(cls):
+        return cls(api_client, poll_interval=float(os.getenv("AVATAR_SETTINGS_POLL_SECONDS", "15")))
+
+    @property
+    def age(self):
+        """Seconds since the server last confirmed the cached settings"""
+        if self._checked_at is None:
+            return None
+        return time.monotonic() - self._checked_at
+
+    def stats(self):
+        return {
+            "etag": self._etag,
+            "polls": self.polls,
+            "changes": self.changes,
+            "failures": self.failures,
+            "age": round(self.age, 1) if self.age is not None else None,
+        }
+
+    def peek(self):
+        """Current settings; defaults until the first successful fetch"""
+        return self._value or default_settings()
+
+    def subscribe(self, callback):
+        """Call callback(settings) on the caller's event loop whenever settings change; returns an unsubscribe function"""
+        entry = (asyncio.get_running_loop(), callback)
+        with self._lock:
+            self._subscribers.add(entry)
+
+        def unsubscribe():
+            with self._lock:
+                self._subscribers.discard(entry)
+
+        return unsubscribe
+
+    def _notify(self, settings):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for loop, callback in subscribers:
+            try:
+                loop.call_soon_threadsafe(callback, settings)
+            except RuntimeError:
+                # The room's loop already closed without unsubscribing
+                with self._lock:
+                    self._subscribers.discard((loop, callback))
+
+    def poll(self):
+        """One conditional fetch; returns True if the settings changed (blocking - call from a thread)"""
+        self.polls += 1
+        headers = {"If-None-Match": self._etag} if self._etag and self._value is not None else None
+        try:
+            response = self.api.get_json(SETTINGS_PATH, headers=headers, timeout=FETCH_TIMEOUT_SECONDS)
+        except Exception as e:
+            self._record_failure(e)
+            return False
+        if response.status == 304:
+            self._checked_at = time.monotonic()
+            return False
+        if is_permanent_error(response.status):
+            self.failures += 1
+            self.stopped = True
+            logger.error(
+                "Avatar settings request rejected (HTTP %d); keeping %s settings and no longer polling",
+                response.status, "the last fetched" if self._value is not None else "default",
+            )
+            return False
+        if not isinstance(response.data, dict):
+            self._record_failure(f"HTTP {response.status}")
+            return False
+
+        settings = _parse_settings(response.data)
+        etag = response.headers.get("ETag")
+        # Compare against what rooms were actually given, which is the defaults until the first fetch
+        first_fetch = self._value is None
+        previous = self.peek()
+        self._value, self._etag = settings, etag
+        self._checked_at = time.monotonic()
+        if first_fetch:
+            logger.info("Fetched avatar settings: voice=%s", settings["voice"])
+        if settings == previous:
+            return False
+        self.changes += 1
+        logger.info("Avatar settings changed: voice=%s, prompt %d chars", settings["voice"], len(settings["prompt"]))
+        self._notify(settings)
+        return True
+
+    def _record_failure(self, reason):
+        self.failures += 1
+        logger.warning("Error fetching avatar settings: %s", reason)
+
+    @property
+    def watching(self):
+        return self._watcher is not None
+
+    def start_watching(self):
+        """Fetch now if nothing is cached, then keep polling in a daemon thread (once per process)"""
+        with self._lock:
+            if self._watcher is not None:
+                return
+            self._watcher = threading.Thread(target=self._watch, name="avatar-settings-watch", daemon=True)
+        if self._value is None:
+            self.poll()
+        self._watcher.start()
+
+    def _watch(self):
+        while not self.stopped:
+            time.sleep(self.poll_interval)
+            self.poll()
+
+
+settings_cache = SettingsCache.from_env()
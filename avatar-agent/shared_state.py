@@ -0,0 +1,40 @@
+"""
+Small JSON state files shared by every process on the host
+Each read-modify-write happens under an exclusive flock and is written
+atomically, so job processes (and thread-executor rooms) see one state.
+"""
+
+import fcntl
+import json
+import os
+from contextlib import contextmanager
+
+
+def pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+@contextmanager
+def locked_json(path):
+    """Yield the state dict under an exclusive lock; changes are written back on exit"""
+    with open(f"{path}.lock", "a+") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            try:
+                with open(path) as f:
+                    state = json.load(f)
+            except (FileNotFoundError, ValueError):
+                state = {}
+            yield state
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(state, f)
+            os.replace(tmp_path, path)
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
@@ -0,0 +1,67 @@
+"""
+Startup pipeline helpers for the avatar agent
+Runs independent startup stages concurrently and times each one, and keeps the
+per-room timeline (job accept through close) that is exported as one record
+"""
+
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger("ong-avatar-agent")
+
+
+class StartupTimer:
+    """Duration of each named startup stage, plus when each milestone was reached
+
+    Created when the job is accepted; marks are seconds since then (monotonic).
+    """
+
+    def __init__(self):
+        self.started_at = time.monotonic()
+        self.started_wall = time.time()
+        self.stages = {}
+        self.marks = {"job_accept": 0.0}
+        self.outcome = "ok"
+
+    def mark(self, event):
+        """Record the first time an event happened"""
+        self.marks.setdefault(event, time.monotonic() - self.started_at)
+
+    async def run(self, stage, awaitable):
+        """Await a stage and record how long it took, whether it succeeded or not"""
+        stage_start = time.monotonic()
+        try:
+            return await awaitable
+        finally:
+            self.stages[stage] = time.monotonic() - stage_start
+            self.mark(stage)
+
+    async def run_concurrently(self, **stages):
+        """Run several stages at once; returns {stage: result or exception}"""
+        names = list(stages)
+        results = await asyncio.gather(
+            *(self.run(name, stages[name]) for name in names),
+            return_exceptions=True,
+        )
+        return dict(zip(names, results))
+
+    @property
+    def elapsed(self):
+        return time.monotonic() - self.started_at
+
+    def summary(self):
+        parts = [f"{name}={duration * 1000:.0f}ms" for name, duration in self.stages.items()]
+        parts.append(f"total={self.elapsed * 1000:.0f}ms")
+        return " ".join(parts)
+
+    def record(self, **fields):
+        """One structured record for the whole room, in milliseconds"""
+        return {
+            "type": "avatar_session",
+            **fields,
+            "outcome": self.outcome,
+            "started_at": self.started_wall,
+            "marks_ms": {name: round(offset * 1000, 1) for name, offset in self.marks.items()},
+            "stages_ms": {name: round(duration * 1000, 1) for name, duration in self.stages.items()},
+        }
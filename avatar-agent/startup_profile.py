@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+Cold-start profiling for the avatar agent (AVATAR_PROFILE_STARTUP=1)
+
+Times every module import (self time, so nested imports aren't counted
+twice) and each initialisation phase agent.py checkpoints, then writes one
+JSON report per process role to AVATAR_PROFILE_DIR:
+
+    startup-worker-<pid>.json   main worker, up to cli.run_app
+    startup-job-<pid>.json      job process, up to the end of prewarm
+
+Run directly to compare fresh-interpreter cold starts for each role:
+
+    python3 startup_profile.py --runs 5
+"""
+
+import argparse
+import importlib.abc
+import json
+import logging
+import os
+import statistics
+import subprocess
+import sys
+import threading
+import time
+
+logger = logging.getLogger("ong-avatar-agent")
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+REPORT_DIR = os.getenv("AVATAR_PROFILE_DIR", "/tmp")
+TOP_MODULES = 25
+
+
+def enabled():
+    return os.getenv("AVATAR_PROFILE_STARTUP", "0") == "1"
+
+
+def _process_age():
+    """Seconds since this process was created, so interpreter startup is included (Linux only)"""
+    try:
+        with open("/proc/self/stat") as f:
+            # The command name can contain spaces; fields after it are fixed
+            start_ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+    except (OSError, IndexError, ValueError):
+        return None
+    return uptime - start_ticks / os.sysconf("SC_CLK_TCK")
+
+
+class _TimedLoader:
+    """Wraps a module's loader to time exec_module; everything else is delegated"""
+
+    def __init__(self, loader, profiler):
+        self._loader = loader
+        self._profiler = profiler
+
+    def __getattr__(self, name):
+        return getattr(self._loader, name)
+
+    def exec_module(self, module):
+        # Module code should see its real loader, not this wrapper
+        module.__loader__ = self._loader
+        if module.__spec__ is not None:
+            module.__spec__.loader = self._loader
+        self._profiler.enter()
+        try:
+            self._loader.exec_module(module)
+        finally:
+            self._profiler.exit(module.__name__)
+
+
+class ImportProfiler(importlib.abc.MetaPathFinder):
+    """Times imports made on the installing thread; background threads' imports pass through untimed"""
+
+    def __init__(self):
+        self.modules = {}  # name -> [self seconds, inclusive seconds]
+        self._stack = []
+        self._finding = False
+        self._thread_id = threading.get_ident()
+
+    def find_spec(self, name, path, target=None):
+        if self._finding or threading.get_ident() != self._thread_id:
+            return None
+        self._finding = True
+        try:
+            for finder in sys.meta_path:
+                if finder is self or not hasattr(finder, "find_spec"):
+                    continue
+                spec = finder.find_spec(name, path, target)
+                if spec is not None:
+                    break
+            else:
+                return None
+        finally:
+            self._finding = False
+        if spec.loader is not None and hasattr(spec.loader, "exec_module"):
+            spec.loader = _TimedLoader(spec.loader, self)
+        return spec
+
+    def enter(self):
+        self._stack.append([time.perf_counter(), 0.0])
+
+    def exit(self, name):
+        started, children = self._stack.pop()
+        inclusive = time.perf_counter() - started
+        self.modules[name] = [inclusive - children, inclusive]
+        if self._stack:
+            self._stack[-1][1] += inclusive
+
+    def summary(self):
+        by_package = {}
+        for name, (self_seconds, _) in self.modules.items():
+            package = name.split(".")[0]
+            by_package[package] = by_package.get(package, 0.0) + self_seconds
+        slowest = sorted(self.modules.items(), key=lambda item: item[1][0], reverse=True)[:TOP_MODULES]
+        return {
+            "modules": len(self.modules),
+            "total_ms": round(sum(s for s, _ in self.modules.values()) * 1000, 1),
+            "by_package_ms": {
+                package: round(seconds * 1000, 1)
+                for package, seconds in sorted(by_package.items(), key=lambda item: item[1], reverse=True)
+                if seconds >= 0.001
+            },
+            "slowest_ms": {name: {"self": round(s * 1000, 1), "inclusive": round(i * 1000, 1)} for name, (s, i) in slowest},
+        }
+
+
+class StartupProfile:
+    def __init__(self):
+        self.imports = None
+        self.phases = {}
+        self.process_age_at_install = None
+        self._installed_at = None
+        self._last = None
+        self._reported = set()
+
+    def install(self):
+        """Start timing imports; call before the heavy imports (no-op unless enabled)"""
+        if not enabled() or self.imports is not None:
+            return
+        self.process_age_at_install = _process_age()
+        self._installed_at = self._last = time.perf_counter()
+        self.imports = ImportProfiler()
+        sys.meta_path.insert(0, self.imports)
+
+    def checkpoint(self, phase):
+        """Attribute the time since the previous checkpoint to phase"""
+        if self.imports is None:
+            return
+        now = time.perf_counter()
+        self.phases[phase] = self.phases.get(phase, 0.0) + now - self._last
+        self._last = now
+
+    def report(self, role):
+        """Write this process's report for role (once) and log the headline numbers"""
+        if self.imports is None or role in self._reported:
+            return None
+        self._reported.add(role)
+        imports = self.imports.summary()
+        process_age = _process_age()
+        report = {
+            "role": role,
+            "pid": os.getpid(),
+            "at": time.time(),
+            "interpreter_startup_ms": (
+                round(self.process_age_at_install * 1000, 1) if self.process_age_at_install is not None else None
+            ),
+            "profiled_ms": round((time.perf_counter() - self._installed_at) * 1000, 1),
+            "process_age_ms": round(process_age * 1000, 1) if process_age is not None else None,
+            "phases_ms": {phase: round(seconds * 1000, 1) for phase, seconds in self.phases.items()},
+            "imports": imports,
+        }
+        path = os.path.join(REPORT_DIR, f"startup-{role}-{os.getpid()}.json")
+        try:
+            with open(path, "w") as f:
+                json.dump(report, f, indent=2)
+        except OSError as e:
+            logger.warning("Failed to write startup profile: %s", e)
+            path = None
+        heaviest = ", ".join(f"{p}={ms}ms" for p, ms in list(imports["by_package_ms"].items())[:5])
+        logger.info(
+            "Startup profile (%s): ready %sms after process start, imports %sms (%s); report: %s",
+            role, report["process_age_ms"], imports["total_ms"], heaviest, path,
+        )
+        return report
+
+
+startup_profile = StartupProfile()
+
+
+# ---------------------------------------------------------------------------
+# Cold-start comparison (fresh interpreter per run)
+# ---------------------------------------------------------------------------
+
+# What each role imports before it can do its job
+ROLE_SCRIPTS = {
+    "worker": "import agent",
+    "job": "import agent; agent.load_plugins()",
+}
+# The baseline: every process imported both plugins at module level, before load_plugins existed
+BASELINE_SCRIPT = "from livekit.plugins import google, simli; import agent"
+
+
+def _time_script(script, env):
+    started = time.perf_counter()
+    subprocess.run([sys.executable, "-c", script], cwd=HERE, env=env, check=True, stdout=subprocess.DEVNULL)
+    return time.perf_counter() - started
+
+
+def _median_ms(script, env, runs):
+    _time_script(script, env)  # Warm the page cache so the first run isn't an outlier
+    return statistics.median(_time_script(script, env) for _ in range(runs)) * 1000
+
+
+def compare(runs):
+    env = {**os.environ, "AVATAR_PROFILE_STARTUP": "0"}
+    baseline = _median_ms(BASELINE_SCRIPT, env, runs)
+    results = {role: _median_ms(script, env, runs) for role, script in ROLE_SCRIPTS.items()}
+    print(f"cold start, median of {runs} fresh interpreters (before: plugins imported at module level):")
+    print(f"  main worker  before {baseline:7.0f}ms  after {results['worker']:7.0f}ms")
+    print(f"  job process  before {baseline:7.0f}ms  after {results['job']:7.0f}ms (plugins load in prewarm)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    compare(parser.parse_args().runs)
@@ -0,0 +1,154 @@
+"""
+JSON-lines logging for the avatar agent (AVATAR_LOG_FORMAT=json)
+Records carry per-room context fields and are serialized and written by a
+background thread, so logging never blocks a job's event loop on the pipe
+to the Node parent. Each line is one JSON object the parent can parse
+directly.
+"""
+
+import atexit
+import contextvars
+import json
+import logging
+import os
+import queue
+import sys
+import threading
+
+LOGGER_NAME = "ong-avatar-agent"
+MAX_BATCH = 256
+
+# Fields of a stock LogRecord; anything else on a record came from extra= and is emitted as-is
+_RECORD_FIELDS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+_context = contextvars.ContextVar("avatar_log_context", default={})
+
+
+def enabled():
+    return os.getenv("AVATAR_LOG_FORMAT", "text") == "json"
+
+
+def bind(**fields):
+    """Attach fields (room, sessionId, ...) to every record logged from this task and the tasks it creates"""
+    _context.set({**_context.get(), **fields})
+
+
+class ContextFilter(logging.Filter):
+    def filter(self, record):
+        record.context = _context.get()
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "pid": record.process,
+            "msg": record.getMessage(),
+        }
+        entry.update(getattr(record, "context", {}))
+        for key, value in vars(record).items():
+            if key not in _RECORD_FIELDS and key != "context":
+                entry[key] = value
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class QueueingHandler(logging.Handler):
+    """Hands records to the writer thread; only the %-formatting happens on the caller's thread"""
+
+    def __init__(self, records):
+        super().__init__()
+        self.records = records
+
+    def emit(self, record):
+        try:
+            # Resolve the message and traceback now - args may be mutated and frames
+            # shouldn't be kept alive while the record waits in the queue
+            record.msg = record.getMessage()
+            record.args = None
+            if record.exc_info:
+                record.exc_text = logging.Formatter().formatException(record.exc_info)
+                record.exc_info = None
+            self.records.put_nowait(record)
+        except Exception:
+            self.handleError(record)
+
+
+class JsonLinesWriter(threading.Thread):
+    """Serializes queued records and writes them to the stream in batches"""
+
+    def __init__(self, records, stream=None):
+        super().__init__(name="avatar-log-writer", daemon=True)
+        self.records = records
+        self.stream = stream or sys.stdout
+        self.formatter = JsonFormatter()
+
+    def run(self):
+        while True:
+            batch = [self.records.get()]
+            while len(batch) < MAX_BATCH:
+                try:
+                    batch.append(self.records.get_nowait())
+                except queue.Empty:
+                    break
+            stop = None in batch
+            lines = [self.formatter.format(record) for record in batch if record is not None]
+            if lines:
+                try:
+                    # One write per batch keeps pipe chatter down and lines whole
+                    self.stream.write("\n".join(lines) + "\n")
+                    self.stream.flush()
+                except (OSError, ValueError):
+                    pass  # Parent went away; nothing useful to do with the records
+            if stop:
+                return
+
+    def stop(self, timeout=1.0):
+        self.records.put(None)
+        self.join(timeout)
+
+
+_writer = None
+
+
+def configure():
+    """Route the agent's logger through the JSON writer; no-op unless AVATAR_LOG_FORMAT=json
+
+    Called at import time in both the main worker and each job process, so every
+    process writes its own lines instead of forwarding records over LiveKit's IPC.
+    """
+    global _writer
+    if not enabled() or _writer is not None:
+        return
+    records = queue.SimpleQueue()
+    _writer = JsonLinesWriter(records)
+    _writer.start()
+
+    handler = QueueingHandler(records)
+    handler.addFilter(ContextFilter())
+    logger = logging.getLogger(LOGGER_NAME)
+    logger.addHandler(handler)
+    logger.propagate = False
+
+    atexit.register(flush)
+    os.register_at_fork(after_in_child=_restart_after_fork)
+
+
+def _restart_after_fork():
+    # Threads don't survive fork; give a forked job process its own writer on the inherited queue
+    global _writer
+    if _writer is not None:
+        _writer = JsonLinesWriter(_writer.records)
+        _writer.start()
+
+
+def flush(timeout=1.0):
+    """Write out anything still queued (call before the process exits)"""
+    global _writer
+    if _writer is not None:
+        _writer.stop(timeout)
+        _writer = None
@@ -0,0 +1,63 @@
+"""
+Bounded teardown for avatar session resources
+Closes everything concurrently, each with its own deadline, and abandons
+anything that overruns so the job process can go back to the pool.
+"""
+
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger("ong-avatar-agent")
+
+DEFAULT_CLOSE_TIMEOUT = 5.0
+
+
+def _consume_result(task):
+    # Retrieve the outcome of abandoned closes so asyncio doesn't log "exception never retrieved"
+    if not task.cancelled():
+        task.exception()
+
+
+class TeardownManager:
+    def __init__(self, default_timeout=DEFAULT_CLOSE_TIMEOUT):
+        self.default_timeout = default_timeout
+        self._resources = []
+        self.summary = None
+
+    def add(self, name, close, timeout=None):
+        """Register an async close function (called with no arguments)"""
+        self._resources.append((name, close, timeout or self.default_timeout))
+
+    async def _close_one(self, name, close, timeout):
+        started = time.monotonic()
+        task = asyncio.ensure_future(close())
+        done, _ = await asyncio.wait({task}, timeout=timeout)
+        if task not in done:
+            # Don't wait for the cancellation to be honoured - a hung close may ignore it
+            task.cancel()
+            task.add_done_callback(_consume_result)
+            status = "timeout"
+            logger.warning("Closing %s took longer than %.1fs, abandoned", name, timeout)
+        elif task.cancelled():
+            status = "cancelled"
+        elif task.exception() is not None:
+            status = "error"
+            logger.warning("Error closing %s: %s", name, task.exception())
+        else:
+            status = "ok"
+        return name, {"status": status, "ms": round((time.monotonic() - started) * 1000, 1)}
+
+    async def run(self):
+        """Close all registered resources; returns (and keeps) a per-resource summary"""
+        started = time.monotonic()
+        resources, self._resources = self._resources, []
+        results = await asyncio.gather(
+            *(self._close_one(name, close, timeout) for name, close, timeout in resources)
+        )
+        self.summary = {
+            "ms": round((time.monotonic() - started) * 1000, 1),
+            "resources": dict(results),
+        }
+        logger.info("Teardown finished in %.0fms: %s", self.summary["ms"], self.summary["resources"])
+        return self.summary
@@ -0,0 +1,285 @@
+"""
+Metrics export for the avatar agent
+Job processes append one JSON line per event; an optional HTTP endpoint in the
+parent process folds that file into Prometheus-style histograms and counters.
+"""
+
+import json
+import logging
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger("ong-avatar-agent")
+
+METRICS_FILE = os.getenv("AVATAR_METRICS_FILE", "/tmp/ong-avatar-metrics.jsonl")
+METRICS_PORT = int(os.getenv("AVATAR_METRICS_PORT", "0"))
+# Rotate the JSON-lines file once it grows past this size
+METRICS_FILE_MAX_BYTES = int(os.getenv("AVATAR_METRICS_FILE_MAX_BYTES", str(50 * 1024 * 1024)))
+
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.0, 3.0, 5.0, 8.0, 13.0, 20.0, 30.0)
+DURATION_BUCKETS = (30.0, 60.0, 120.0, 300.0, 600.0, 1200.0, 1800.0, 3600.0)
+
+
+def emit(record):
+    """Append one metrics record to the JSON-lines file (no-op when disabled)"""
+    if not METRICS_FILE:
+        return
+    line = json.dumps(record, separators=(",", ":")) + "\n"
+    try:
+        if os.path.exists(METRICS_FILE) and os.path.getsize(METRICS_FILE) > METRICS_FILE_MAX_BYTES:
+            os.replace(METRICS_FILE, f"{METRICS_FILE}.1")
+        # O_APPEND keeps lines from concurrent job processes intact
+        fd = os.open(METRICS_FILE, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, line.encode("utf-8"))
+        finally:
+            os.close(fd)
+    except OSError as e:
+        logger.warning("Failed to write metrics record: %s", e)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in sorted(labels.items())) + "}"
+
+
+def _format_le(bound):
+    return "+Inf" if bound == float("inf") else repr(bound)
+
+
+class Histogram:
+    def __init__(self, name, help_text, buckets, label_name=None):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(buckets) + (float("inf"),)
+        self.label_name = label_name
+        self._series = {}
+
+    def observe(self, value, label=None):
+        series = self._series.setdefault(label, {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0})
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                series["counts"][i] += 1
+        series["sum"] += value
+        series["count"] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for label, series in sorted(self._series.items(), key=lambda item: str(item[0])):
+            labels = {self.label_name: label} if self.label_name and label is not None else {}
+            for bound, count in zip(self.buckets, series["counts"]):
+                lines.append(f"{self.name}_bucket{_format_labels({**labels, 'le': _format_le(bound)})} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {series['sum']}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {series['count']}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name, help_text, label_name=None):
+        self.name = name
+        self.help_text = help_text
+        self.label_name = label_name
+        self._values = {}
+
+    def inc(self, label=None, amount=1):
+        self._values[label] = self._values.get(label, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        for label, value in sorted(self._values.items(), key=lambda item: str(item[0])):
+            labels = {self.label_name: label} if self.label_name and label is not None else {}
+            lines.append(f"{self.name}{_format_labels(labels)} {value}")
+        return lines
+
+
+class Gauge:
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help_text = help_text
+        self.value = None
+
+    def set(self, value):
+        self.value = value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} gauge"]
+        if self.value is not None:
+            lines.append(f"{self.name} {self.value}")
+        return lines
+
+
+class MetricsAggregator:
+    """Folds records from the JSON-lines file into histograms and counters"""
+
+    def __init__(self, path):
+        self.path = path
+        self._offset = 0
+        self._inode = None
+        self._lock = threading.Lock()
+        self.sessions = Counter("ong_avatar_sessions_total", "Avatar sessions by outcome", "outcome")
+        self.startup_stages = Histogram(
+            "ong_avatar_startup_stage_seconds", "Duration of each startup stage", LATENCY_BUCKETS, "stage"
+        )
+        self.time_to_first_audio = Histogram(
+            "ong_avatar_time_to_first_audio_seconds", "Job accept to first greeting audio", LATENCY_BUCKETS
+        )
+        self.session_duration = Histogram(
+            "ong_avatar_session_duration_seconds", "Job accept to session close", DURATION_BUCKETS
+        )
+        self.teardown = Histogram("ong_avatar_teardown_seconds", "Time to close session resources", LATENCY_BUCKETS)
+        self.teardown_timeouts = Counter(
+            "ong_avatar_teardown_timeouts_total", "Resource closes abandoned at their deadline", "resource"
+        )
+        self.watchdog_expiries = Counter(
+            "ong_avatar_watchdog_expiries_total", "Sessions ended by the watchdog", "reason"
+        )
+        self.reclaimed_minutes = Counter(
+            "ong_avatar_reclaimed_session_minutes_total", "Session-minutes reclaimed from orphaned rooms"
+        )
+        self.greetings = Counter("ong_avatar_greetings_total", "Greetings by audio source", "source")
+        self.loop_max_lag = Histogram(
+            "ong_avatar_job_loop_max_lag_seconds", "Worst event-loop lag seen in each job", LATENCY_BUCKETS
+        )
+        self.loop_stalls = Counter("ong_avatar_job_loop_stalls_total", "Event-loop stalls over the lag threshold")
+        self.idle_target = Gauge("ong_avatar_idle_process_target", "Warm job processes the worker keeps ready")
+        self.idle_changes = Counter(
+            "ong_avatar_idle_target_changes_total", "Idle pool resizes by direction", "direction"
+        )
+        self.rejections = Counter("ong_avatar_rooms_rejected_total", "Rooms refused by admission control", "reason")
+        self.context_compactions = Counter(
+            "ong_avatar_context_compactions_total", "Conversation history folded into a summary to bound context"
+        )
+        self.audio_only = Counter(
+            "ong_avatar_audio_only_sessions_total", "Sessions run voice only (no Simli video), by reason", "reason"
+        )
+        self.circuit_opens = Counter(
+            "ong_avatar_circuit_opens_total", "Backend startup circuits opened (or reopened by a failed probe)", "backend"
+        )
+
+    def metrics(self):
+        return [
+            self.sessions,
+            self.startup_stages,
+            self.time_to_first_audio,
+            self.session_duration,
+            self.teardown,
+            self.teardown_timeouts,
+            self.watchdog_expiries,
+            self.reclaimed_minutes,
+            self.greetings,
+            self.loop_max_lag,
+            self.loop_stalls,
+            self.idle_target,
+            self.idle_changes,
+            self.rejections,
+            self.context_compactions,
+            self.audio_only,
+            self.circuit_opens,
+        ]
+
+    def observe(self, record):
+        if record.get("type") == "idle_pool":
+            self.idle_target.set(record["target"])
+            self.idle_changes.inc("grow" if record["target"] > record["previous"] else "shrink")
+            return
+        if record.get("type") == "admission_rejected":
+            self.rejections.inc(record.get("reason"))
+            return
+        if record.get("type") == "circuit":
+            if record.get("state") == "open":
+                self.circuit_opens.inc(record.get("backend"))
+            return
+        if record.get("type") != "avatar_session":
+            return
+        self.sessions.inc(record.get("outcome", "unknown"))
+        for stage, duration_ms in record.get("stages_ms", {}).items():
+            self.startup_stages.observe(duration_ms / 1000, stage)
+        marks = record.get("marks_ms", {})
+        if "first_audio" in marks:
+            self.time_to_first_audio.observe(marks["first_audio"] / 1000)
+        if "close" in marks:
+            self.session_duration.observe(marks["close"] / 1000)
+        teardown = record.get("teardown")
+        if teardown:
+            self.teardown.observe(teardown["ms"] / 1000)
+            for resource, result in teardown["resources"].items():
+                if result["status"] == "timeout":
+                    self.teardown_timeouts.inc(resource)
+        watchdog = record.get("watchdog")
+        if watchdog and watchdog["expired"]:
+            self.watchdog_expiries.inc(watchdog["expired"])
+            self.reclaimed_minutes.inc(amount=watchdog["reclaimed_minutes"])
+        if record.get("greeting"):
+            self.greetings.inc(record["greeting"])
+        if record.get("audio_only"):
+            self.audio_only.inc(record["audio_only"])
+        context = record.get("context")
+        if context:
+            self.context_compactions.inc(amount=context["compactions"])
+        loop = record.get("loop")
+        if loop:
+            self.loop_max_lag.observe(loop["max_lag_ms"] / 1000)
+            self.loop_stalls.inc(amount=loop["stalls"])
+
+    def _read_new_records(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return
+        # Start over if the file was rotated or truncated
+        if stat.st_ino != self._inode or stat.st_size < self._offset:
+            self._inode = stat.st_ino
+            self._offset = 0
+        with open(self.path, "rb") as f:
+            f.seek(self._offset)
+            for raw in f:
+                if not raw.endswith(b"\n"):
+                    break  # Partial line still being written
+                self._offset += len(raw)
+                try:
+                    self.observe(json.loads(raw))
+                except ValueError:
+                    continue
+
+    def render(self):
+        with self._lock:
+            self._read_new_records()
+            lines = []
+            for metric in self.metrics():
+                lines.extend(metric.render())
+            return "\n".join(lines) + "\n"
+
+
+def start_metrics_server(port=METRICS_PORT, path=METRICS_FILE):
+    """Serve /metrics from a daemon thread; returns the server, or None when disabled"""
+    if not port or not path:
+        return None
+
+    aggregator = MetricsAggregator(path)
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.rstrip("/") != "/metrics":
+                self.send_error(404)
+                return
+            body = aggregator.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass  # Scrapes would otherwise flood the agent log
+
+    try:
+        server = ThreadingHTTPServer(("127.0.0.1", port), MetricsHandler)
+    except OSError as e:
+        logger.warning("Metrics endpoint disabled, could not bind port %d: %s", port, e)
+        return None
+
+    threading.Thread(target=server.serve_forever, name="avatar-metrics", daemon=True).start()
+    logger.info("Serving avatar metrics on http://127.0.0.1:%d/metrics", port)
+    return server
@@ -0,0 +1,182 @@
+"""
+Conversation transcripts for quality review (AVATAR_TRANSCRIPTS=1)
+Session events only append to a bounded in-memory ring buffer; one spool
+thread per process drains every room's buffer in batches into gzip-
+compressed, size-rotated JSON-lines files. A chatty room (or a stuck disk)
+loses its oldest lines rather than growing memory or blocking the loop.
+"""
+
+import asyncio
+import collections
+import fcntl
+import gzip
+import json
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger("ong-avatar-agent")
+
+FLUSH_INTERVAL_SECONDS = float(os.getenv("AVATAR_TRANSCRIPT_FLUSH_SECONDS", "10"))
+# Per-room ring buffer limits between flushes
+MAX_ENTRIES = int(os.getenv("AVATAR_TRANSCRIPT_MAX_ENTRIES", "500"))
+MAX_BYTES = int(os.getenv("AVATAR_TRANSCRIPT_MAX_BYTES", str(256 * 1024)))
+MAX_TEXT_CHARS = 4000
+
+
+class TranscriptBuffer:
+    """One room's transcript lines waiting for the spool; appending never blocks on I/O"""
+
+    def __init__(self, room, session_id=None, avatar_session_id=None, max_entries=MAX_ENTRIES, max_bytes=MAX_BYTES):
+        self.room = room
+        self.session_id = session_id
+        self.avatar_session_id = avatar_session_id
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.seq = 0
+        self.dropped = 0
+        self._entries = collections.deque()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def enabled():
+        return os.getenv("AVATAR_TRANSCRIPTS", "0") == "1"
+
+    def attach(self, session):
+        @session.on("conversation_item_added")
+        def on_item_added(event):
+            text = getattr(event.item, "text_content", None)
+            if text:
+                self.append(getattr(event.item, "role", None), text)
+
+    def append(self, role, text):
+        entry = {
+            "room": self.room,
+            "sessionId": self.session_id,
+            "avatarSessionId": self.avatar_session_id,
+            "seq": self.seq,
+            "ts": round(time.time(), 3),
+            "role": role,
+            "text": text[:MAX_TEXT_CHARS],
+        }
+        size = len(entry["text"]) + 128  # Rough serialized size; exact bytes aren't worth computing here
+        self.seq += 1
+        with self._lock:
+            self._entries.append((entry, size))
+            self._bytes += size
+            # Ring buffer: the spool fell behind, so the oldest unsent lines go
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, dropped_size = self._entries.popleft()
+                self._bytes -= dropped_size
+                self.dropped += 1
+
+    def drain(self):
+        with self._lock:
+            entries = [entry for entry, _ in self._entries]
+            self._entries.clear()
+            self._bytes = 0
+        return entries
+
+
+class TranscriptSpool:
+    """Process-wide writer thread; batches from every room share one compressed file
+
+    Each flush is compressed off the lock and appended as one gzip member, so the
+    files stay readable with zcat even though several job processes append to them.
+    Rotation happens under an flock so only one process renames the files.
+    """
+
+    def __init__(self, directory, interval=FLUSH_INTERVAL_SECONDS, max_file_bytes=20 * 1024 * 1024, keep_files=5):
+        self.directory = directory
+        self.path = os.path.join(directory, "transcripts.jsonl.gz")
+        self.interval = interval
+        self.max_file_bytes = max_file_bytes
+        self.keep_files = keep_files
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._buffers = set()
+        self._wake = threading.Event()
+        self._thread = None
+        self.written = 0
+        self.failures = 0
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            os.getenv("AVATAR_TRANSCRIPT_DIR", "/tmp/ong-transcripts"),
+            max_file_bytes=int(os.getenv("AVATAR_TRANSCRIPT_FILE_MAX_BYTES", str(20 * 1024 * 1024))),
+            keep_files=int(os.getenv("AVATAR_TRANSCRIPT_FILES", "5")),
+        )
+
+    def track(self, buffer):
+        with self._lock:
+            self._buffers.add(buffer)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="avatar-transcript-spool", daemon=True)
+                self._thread.start()
+
+    async def finish(self, buffer):
+        """Write out a finished room's remaining lines and stop draining it"""
+        with self._lock:
+            self._buffers.discard(buffer)
+        await asyncio.to_thread(self._write, buffer.drain())
+        if buffer.dropped:
+            logger.warning("Transcript for room %s dropped %d lines (spool fell behind)", buffer.room, buffer.dropped)
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            self.flush()
+
+    def flush(self):
+        """Drain every tracked room into one batch; blocking, call from a thread"""
+        with self._lock:
+            buffers = list(self._buffers)
+        self._write([entry for buffer in buffers for entry in buffer.drain()])
+
+    def _write(self, entries):
+        if not entries:
+            return
+        payload = "".join(json.dumps(entry, ensure_ascii=False) + "\n" for entry in entries)
+        member = gzip.compress(payload.encode("utf-8"))
+        with self._flush_lock:
+            try:
+                os.makedirs(self.directory, exist_ok=True)
+                with open(f"{self.path}.lock", "a+") as lock_file:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+                    try:
+                        self._rotate()
+                        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+                        try:
+                            os.write(fd, member)
+                        finally:
+                            os.close(fd)
+                    finally:
+                        fcntl.flock(lock_file, fcntl.LOCK_UN)
+            except OSError as e:
+                # Dropped rather than retried: holding them would let a full disk grow memory
+                self.failures += 1
+                logger.warning("Failed to write %d transcript lines: %s", len(entries), e)
+                return
+            self.written += len(entries)
+
+    def _rotate(self):
+        try:
+            if os.path.getsize(self.path) < self.max_file_bytes:
+                return
+        except FileNotFoundError:
+            return
+        for i in range(self.keep_files - 1, 0, -1):
+            older = f"{self.path}.{i}"
+            if os.path.exists(older):
+                os.replace(older, f"{self.path}.{i + 1}")
+        os.replace(self.path, f"{self.path}.1")
+        stale = f"{self.path}.{self.keep_files}"
+        if os.path.exists(stale):
+            os.remove(stale)
+
+
+transcript_spool = TranscriptSpool.from_env()
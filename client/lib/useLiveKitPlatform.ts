@@ -8,6 +8,30 @@ interface SessionData {
   livekitUrl: string;
 }
 
+// Messages the avatar agent sends on the "ong-avatar" data topic
+export interface AgentNotice {
+  type: string;
+  backend?: string;
+  mode?: string;
+  reason?: string;
+  message?: string;
+  retryAfterSeconds?: number;
+}
+
+const AGENT_NOTICE_TOPIC = "ong-avatar";
+
+function parseAgentNotice(payload: Uint8Array, topic?: string): AgentNotice | null {
+  if (topic !== AGENT_NOTICE_TOPIC) {
+    return null;
+  }
+  try {
+    return JSON.parse(new TextDecoder().decode(payload));
+  } catch (e) {
+    console.log("Ignoring malformed agent notice:", e);
+    return null;
+  }
+}
+
 interface UseLiveKitPlatformReturn {
   connect: (sessionData: SessionData) => Promise<boolean>;
   disconnect: () => Promise<void>;
@@ -15,6 +39,7 @@ interface UseLiveKitPlatformReturn {
   remoteAudioTrack: any;
   isConnected: boolean;
   error: string | null;
+  agentNotice: AgentNotice | null;
   webVideoRef: React.RefObject<HTMLVideoElement | null> | null;
 }
 
@@ -41,6 +66,7 @@ export function useLiveKitPlatform(): UseLiveKitPlatformReturn {
   const [remoteAudioTrack, setRemoteAudioTrack] = useState<any>(null);
   const [isConnected, setIsConnected] = useState(false);
   const [error, setError] = useState<string | null>(null);
+  const [agentNotice, setAgentNotice] = useState<AgentNotice | null>(null);
   const webVideoRef = useRef<HTMLVideoElement>(null);
   const webAudioRef = useRef<HTMLAudioElement>(null);
 
@@ -72,6 +98,14 @@ export function useLiveKitPlatform(): UseLiveKitPlatformReturn {
       }
     });
 
+    room.on(NativeRoomEvent.DataReceived, (payload: Uint8Array, participant: any, kind: any, topic?: string) => {
+      const notice = parseAgentNotice(payload, topic);
+      if (notice) {
+        console.log("[LiveKit Native] Agent notice:", notice.type);
+        setAgentNotice(notice);
+      }
+    });
+
     room.on(NativeRoomEvent.Disconnected, () => {
       console.log("[LiveKit Native] Disconnected from room");
       setRemoteVideoTrack(null);
@@ -137,6 +171,14 @@ export function useLiveKitPlatform(): UseLiveKitPlatformReturn {
         }
       });
 
+      room.on(RoomEvent.DataReceived, (payload, participant, kind, topic) => {
+        const notice = parseAgentNotice(payload, topic);
+        if (notice) {
+          console.log("[LiveKit Web] Agent notice:", notice.type);
+          setAgentNotice(notice);
+        }
+      });
+
       room.on(RoomEvent.Disconnected, () => {
         console.log("[LiveKit Web] Disconnected from room");
         setRemoteVideoTrack(null);
@@ -166,6 +208,7 @@ export function useLiveKitPlatform(): UseLiveKitPlatformReturn {
 
   const connect = useCallback(async (sessionData: SessionData): Promise<boolean> => {
     setError(null);
+    setAgentNotice(null);
     try {
       if (Platform.OS === "web") {
         return await connectWeb(sessionData);
@@ -198,6 +241,7 @@ export function useLiveKitPlatform(): UseLiveKitPlatformReturn {
     setRemoteAudioTrack(null);
     setIsConnected(false);
     setError(null);
+    setAgentNotice(null);
   }, []);
 
   useEffect(() => {
@@ -215,6 +259,7 @@ export function useLiveKitPlatform(): UseLiveKitPlatformReturn {
     remoteAudioTrack,
     isConnected,
     error,
+    agentNotice,
     webVideoRef: Platform.OS === "web" ? webVideoRef : null,
   };
 }
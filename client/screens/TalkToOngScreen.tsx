@@ -40,11 +40,24 @@ interface SessionData {
   roomName: string;
   token: string;
   livekitUrl: string;
+  avatarMode?: "video" | "audio";
   simliConfig: {
     faceId: string;
   };
 }
 
+// Skip the avatar video on slow or metered web connections; Ong still talks
+function prefersAudioOnly(): boolean {
+  if (Platform.OS !== "web" || typeof navigator === "undefined") {
+    return false;
+  }
+  const connection = (navigator as any).connection;
+  if (!connection) {
+    return false;
+  }
+  return connection.saveData === true || ["slow-2g", "2g", "3g"].includes(connection.effectiveType);
+}
+
 export default function TalkToOngScreen() {
   const { theme, isDark } = useTheme();
   const { user, sessionToken, updateUser } = useAuth();
@@ -58,6 +71,7 @@ export default function TalkToOngScreen() {
     disconnect: disconnectLiveKit,
     remoteVideoTrack,
     isConnected: isLiveKitConnected,
+    agentNotice,
     webVideoRef,
   } = useLiveKitPlatform();
 
@@ -65,6 +79,7 @@ export default function TalkToOngScreen() {
   const [isConnecting, setIsConnecting] = useState(false);
   const [sessionDuration, setSessionDuration] = useState(0);
   const [connectionError, setConnectionError] = useState<string | null>(null);
+  const [isVoiceOnly, setIsVoiceOnly] = useState(false);
   const [micPermissionGranted, setMicPermissionGranted] = useState(false);
 
   // Check if avatar agent is available
@@ -212,6 +227,7 @@ export default function TalkToOngScreen() {
 
     setIsConnecting(true);
     setConnectionError(null);
+    setIsVoiceOnly(false);
 
     try {
       if (Platform.OS === "web") {
@@ -222,7 +238,7 @@ export default function TalkToOngScreen() {
         }
       }
 
-      const response = await apiRequest("POST", "/api/avatar/session/start", {}, { token: sessionToken });
+      const response = await apiRequest("POST", "/api/avatar/session/start", { audioOnly: prefersAudioOnly() }, { token: sessionToken });
       
       if (!response.ok) {
         const data = await response.json();
@@ -231,6 +247,7 @@ export default function TalkToOngScreen() {
 
       const sessionData: SessionData = await response.json();
       sessionDataRef.current = sessionData;
+      setIsVoiceOnly(sessionData.avatarMode === "audio");
 
       await connectLiveKit(sessionData);
 
@@ -266,6 +283,19 @@ export default function TalkToOngScreen() {
     }
   };
 
+  // The agent turns rooms away at once while Gemini is failing, and drops to voice only
+  // when the avatar video can't start; don't leave the user waiting for either
+  useEffect(() => {
+    if (agentNotice?.type === "avatar_mode" && agentNotice.mode === "audio") {
+      setIsVoiceOnly(true);
+    }
+    if (agentNotice?.type === "avatar_unavailable") {
+      endSession().then(() => {
+        setConnectionError(agentNotice.message || "Ong is unavailable right now. Please try again in a minute.");
+      });
+    }
+  }, [agentNotice]);
+
   const confirmEndSession = () => {
     if (Platform.OS === "web") {
       if (window.confirm("End your conversation with Ong?")) {
@@ -287,6 +317,32 @@ export default function TalkToOngScreen() {
   const estimatedMinutes = Math.floor(creditsRemaining / CREDITS_PER_MINUTE);
 
   const renderAvatarDisplay = () => {
+    if (isSessionActive && isVoiceOnly) {
+      return (
+        <View style={styles.avatarPlaceholder}>
+          <View style={[styles.avatarCircle, { backgroundColor: theme.surface, overflow: 'hidden' }]}>
+            <RNImage
+              source={require("@/assets/ong-placeholder.png")}
+              style={{ width: "100%", height: "100%" }}
+              resizeMode="cover"
+            />
+          </View>
+          <ThemedText style={[styles.avatarName, { color: theme.text }]}>
+            Ong
+          </ThemedText>
+          <View style={styles.sessionInfo}>
+            <View style={[styles.liveIndicator, { backgroundColor: Colors.light.primary }]} />
+            <ThemedText style={[styles.sessionDuration, { color: theme.text }]}>
+              {formatDuration(sessionDuration)}
+            </ThemedText>
+          </View>
+          <ThemedText style={[styles.avatarDescription, { color: theme.textSecondary }]}>
+            Voice only
+          </ThemedText>
+        </View>
+      );
+    }
+
     if (isSessionActive && remoteVideoTrack && Platform.OS !== "web" && NativeVideoView) {
       return (
         <View style={styles.videoContainer}>
@@ -50,7 +50,7 @@ import {
 import { directConversations, encryptedMessages, userPublicKeys } from "./db/schema";
 import { uploadToR2, uploadBase64ToR2, isR2Configured, getObjectFromR2 } from "./services/r2";
 import { getNextGeminiApiKey, releaseGeminiApiKey, getKeyStatus, isGeminiConfigured, getGeminiKeyForSession } from "./services/gemini-keys";
-import { restartAvatarAgent, stopAvatarAgent, getAvatarAgentStatus } from "./services/avatar-agent";
+import { restartAvatarAgent, stopAvatarAgent, getAvatarAgentStatus, isAvatarAgentToken } from "./services/avatar-agent";
 import {
   getBillingProviders,
   getBillingProviderWithKeys,
@@ -232,6 +232,26 @@ async function endAvatarSession(sessionId: string, messageCount?: number, userMe
   }
 }
 
+// Ends the session only while it is still active; returns whether this call ended it
+async function endActiveAvatarSession(sessionId: string, messageCount: number, userMessageCount: number, avatarResponseCount: number, status: "completed" | "failed", errorMessage?: string): Promise<boolean> {
+  const [session] = await db.select({ startedAt: avatarSessions.startedAt }).from(avatarSessions).where(eq(avatarSessions.id, sessionId));
+  if (!session) return false;
+  const durationSeconds = Math.floor((Date.now() - session.startedAt.getTime()) / 1000);
+  const ended = await db.update(avatarSessions)
+    .set({
+      endedAt: new Date(),
+      durationSeconds,
+      messageCount,
+      userMessageCount,
+      avatarResponseCount,
+      status,
+      errorMessage: errorMessage || null,
+    })
+    .where(and(eq(avatarSessions.id, sessionId), eq(avatarSessions.status, "active")))
+    .returning({ id: avatarSessions.id });
+  return ended.length > 0;
+}
+
 let vertexAccessToken: string | null = null;
 let vertexTokenExpiry: number = 0;
 
@@ -7370,6 +7390,8 @@ User Question: ${message}`;
 
       const sessionId = `avatar_${userId}_${Date.now()}`;
       const roomName = `ong-room-${userId}-${Date.now()}`;
+      // Clients on a weak or metered link ask for voice only; the agent then skips Simli video
+      const avatarMode = req.body?.audioOnly === true ? "audio" : "video";
 
       // Get a Gemini API key for this session
       const apiKey = getNextGeminiApiKey(sessionId);
@@ -7401,6 +7423,9 @@ User Question: ${message}`;
 
       const token = await at.toJwt();
 
+      // Create avatar session for tracking (the agent reports its metrics against this id)
+      const avatarSessionId = await createAvatarSession(userId, "ong", undefined, req.get("User-Agent")?.includes("Mobile") ? "mobile" : "web");
+
       // Create the room with metadata for the Python agent
       const roomService = new RoomServiceClient(livekitUrl, livekitApiKey, livekitApiSecret);
       try {
@@ -7410,6 +7435,8 @@ User Question: ${message}`;
             geminiKeyIndex,
             sessionId,
             userId,
+            avatarSessionId,
+            avatarMode,
           }),
         });
         console.log(`[Avatar] Created LiveKit room: ${roomName}`);
@@ -7424,19 +7451,16 @@ User Question: ${message}`;
       await db.insert(activityLogs).values({
         userId,
         action: "avatar_session_started",
-        metadata: { sessionId, roomName, geminiKeyIndex },
+        metadata: { sessionId, roomName, geminiKeyIndex, avatarMode },
       });
 
-      // Create avatar session for tracking
-      const avatarSessionId = await createAvatarSession(userId, "ong", undefined, req.get("User-Agent")?.includes("Mobile") ? "mobile" : "web");
-
       // Log feature usage
       logFeatureUsage({
         userId,
         category: "avatar",
         featureName: "avatar_session",
         subFeature: "ong",
-        metadata: { sessionId, roomName, avatarSessionId },
+        metadata: { sessionId, roomName, avatarSessionId, avatarMode },
         ipAddress: req.ip,
         userAgent: req.get("User-Agent"),
       });
@@ -7448,6 +7472,7 @@ User Question: ${message}`;
         token,
         livekitUrl,
         avatarSessionId,
+        avatarMode,
         simliConfig: {
           faceId: simliFaceId,
         },
@@ -7499,6 +7524,63 @@ User Question: ${message}`;
     }
   });
 
+  // Internal endpoint for the avatar agent to report per-session conversation metrics in batches
+  // Snapshots are cumulative, so a retried batch just rewrites the same totals; a final snapshot
+  // ends the session and logs its usage only if it is the one that moves the row out of "active"
+  app.post("/api/avatar/agent/metrics", async (req, res) => {
+    if (!isAvatarAgentToken(req.get("X-Avatar-Agent-Token"))) {
+      return res.status(403).json({ error: "Forbidden" });
+    }
+    try {
+      const sessions = Array.isArray(req.body?.sessions) ? req.body.sessions : [];
+      for (const entry of sessions) {
+        if (typeof entry?.avatarSessionId !== "string") continue;
+
+        if (!entry.final) {
+          await db.update(avatarSessions)
+            .set({
+              messageCount: entry.messageCount || 0,
+              userMessageCount: entry.userMessageCount || 0,
+              avatarResponseCount: entry.avatarResponseCount || 0,
+            })
+            .where(and(eq(avatarSessions.id, entry.avatarSessionId), eq(avatarSessions.status, "active")));
+          continue;
+        }
+
+        const failed = entry.outcome && entry.outcome !== "ok";
+        const ended = await endActiveAvatarSession(
+          entry.avatarSessionId,
+          entry.messageCount || 0,
+          entry.userMessageCount || 0,
+          entry.avatarResponseCount || 0,
+          failed ? "failed" : "completed",
+          failed ? entry.outcome : undefined,
+        );
+        if (!ended) continue; // Already ended (a retried final batch, or the session/end route)
+        logFeatureUsage({
+          userId: entry.userId,
+          category: "avatar",
+          featureName: "avatar_session",
+          subFeature: "ong_conversation",
+          durationMs: Math.round((entry.durationSeconds || 0) * 1000),
+          status: failed ? "failed" : "success",
+          metadata: {
+            avatarSessionId: entry.avatarSessionId,
+            sessionId: entry.sessionId,
+            userSpeakingSeconds: entry.userSpeakingSeconds,
+            avatarSpeakingSeconds: entry.avatarSpeakingSeconds,
+            inputTokens: entry.inputTokens,
+            outputTokens: entry.outputTokens,
+          },
+        });
+      }
+      res.json({ success: true, accepted: sessions.length });
+    } catch (error) {
+      log(`Error recording avatar agent metrics: ${error}`);
+      res.status(500).json({ error: "Failed to record avatar metrics" });
+    }
+  });
+
   // Get avatar service status (for admin)
   app.get("/api/avatar/status", requireAuth, requireAdmin, async (req: AuthenticatedRequest, res) => {
     try {
@@ -1,6 +1,9 @@
 import { spawn, ChildProcess, execSync } from "child_process";
+import crypto from "crypto";
 import path from "path";
 import fs from "fs";
+import readline from "readline";
+import type { Readable } from "stream";
 
 let avatarAgentProcess: ChildProcess | null = null;
 let avatarAgentIntentionalStop = false;
@@ -11,11 +14,59 @@ let avatarAgentDisabled = false;
 let avatarAgentDisabledReason: string | null = null;
 const AVATAR_AGENT_MAX_RESTARTS = 3;
 const AVATAR_AGENT_RESTART_WINDOW_MS = 600000; // 10 minutes
+// How long a draining agent may keep serving its active rooms (the agent's LiveKit drain_timeout)
+const AVATAR_AGENT_DRAIN_TIMEOUT_MS = (Number(process.env.AVATAR_DRAIN_TIMEOUT) || 600) * 1000;
+
+// Old agent processes finishing their rooms after a restart or stop; they exit on their own
+const drainingAgents = new Set<ChildProcess>();
+
+// Shared secret the agent sends when reporting back to internal endpoints
+// (set AVATAR_AGENT_TOKEN explicitly when the agent is started outside this server)
+const avatarAgentToken = process.env.AVATAR_AGENT_TOKEN || crypto.randomBytes(24).toString("hex");
 
 function log(message: string) {
   console.log(message);
 }
 
+// Structured log line written by the agent when AVATAR_LOG_FORMAT=json
+// (LiveKit's own JSON log lines use "message" instead of "msg")
+interface AgentLogRecord {
+  level?: string;
+  msg?: string;
+  message?: string;
+  room?: string;
+  exc?: string;
+}
+
+function forwardAgentLine(line: string, fallback: (message: string) => void) {
+  if (!line.trim()) return;
+  if (line.startsWith("{")) {
+    try {
+      const record: AgentLogRecord = JSON.parse(line);
+      const room = record.room ? ` [${record.room}]` : "";
+      const text = record.msg ?? record.message ?? "";
+      const message = `[Avatar Agent]${room} ${text}${record.exc ? `\n${record.exc}` : ""}`;
+      const level = record.level?.toLowerCase();
+      if (level === "error" || level === "critical") {
+        console.error(message);
+      } else {
+        log(message);
+      }
+      return;
+    } catch {
+      // Not one of ours (or a truncated line) - pass it through as text
+    }
+  }
+  fallback(`[Avatar Agent] ${line}`);
+}
+
+function forwardAgentStream(stream: Readable | null, fallback: (message: string) => void) {
+  if (!stream) return;
+  // readline buffers partial chunks, so a record split across two reads still parses
+  readline.createInterface({ input: stream, crlfDelay: Infinity })
+    .on("line", (line) => forwardAgentLine(line, fallback));
+}
+
 export function startAvatarAgent() {
   if (avatarAgentDisabled) {
     log(`[Avatar Agent] Agent is disabled: ${avatarAgentDisabledReason}`);
@@ -48,48 +99,47 @@ export function startAvatarAgent() {
     LIVEKIT_URL: process.env.LIVEKIT_URL,
     LIVEKIT_API_KEY: process.env.LIVEKIT_API_KEY,
     LIVEKIT_API_SECRET: process.env.LIVEKIT_API_SECRET,
-    // Gemini keys (agent supports GEMINI_API_KEY_1-5 and GOOGLE_AI_API_KEY)
+    // Gemini keys (agent supports GEMINI_API_KEY_1-5, GEMINI_AVATAR_API_KEY and GOOGLE_AI_API_KEY)
     GEMINI_API_KEY_1: process.env.GEMINI_API_KEY_1,
     GEMINI_API_KEY_2: process.env.GEMINI_API_KEY_2,
     GEMINI_API_KEY_3: process.env.GEMINI_API_KEY_3,
     GEMINI_API_KEY_4: process.env.GEMINI_API_KEY_4,
     GEMINI_API_KEY_5: process.env.GEMINI_API_KEY_5,
+    GEMINI_AVATAR_API_KEY: process.env.GEMINI_AVATAR_API_KEY,
     GOOGLE_AI_API_KEY: process.env.GOOGLE_AI_API_KEY,
     // Simli avatar
     SIMLI_API_KEY: process.env.SIMLI_API_KEY,
     SIMLI_FACE_ID: process.env.SIMLI_FACE_ID,
+    AVATAR_AGENT_TOKEN: avatarAgentToken,
+    AVATAR_DRAIN_TIMEOUT: String(AVATAR_AGENT_DRAIN_TIMEOUT_MS / 1000),
+    // Agent logs as JSON lines (set AVATAR_LOG_FORMAT=text for the plain format)
+    AVATAR_LOG_FORMAT: process.env.AVATAR_LOG_FORMAT || "json",
   };
 
   avatarAgentStartTime = Date.now();
-  avatarAgentProcess = spawn("python3", [agentScriptPath, agentMode], {
+  const child = spawn("python3", [agentScriptPath, agentMode], {
     cwd: agentPath,
     stdio: ["ignore", "pipe", "pipe"],
     env: agentEnv,
   });
+  avatarAgentProcess = child;
 
-  avatarAgentProcess.stdout?.on("data", (data) => {
-    const lines = data.toString().trim().split("\n");
-    lines.forEach((line: string) => {
-      if (line.trim()) {
-        log(`[Avatar Agent] ${line}`);
-      }
-    });
-  });
-
-  avatarAgentProcess.stderr?.on("data", (data) => {
-    const lines = data.toString().trim().split("\n");
-    lines.forEach((line: string) => {
-      if (line.trim()) {
-        console.error(`[Avatar Agent] ${line}`);
-      }
-    });
-  });
+  forwardAgentStream(child.stdout, log);
+  forwardAgentStream(child.stderr, (message) => console.error(message));
 
-  avatarAgentProcess.on("error", (error) => {
+  child.on("error", (error) => {
     console.error("[Avatar Agent] Failed to start:", error.message);
   });
 
-  avatarAgentProcess.on("exit", (code, signal) => {
+  child.on("exit", (code, signal) => {
+    if (drainingAgents.delete(child)) {
+      log(`[Avatar Agent] Drained process ${child.pid} exited (code ${code}, signal ${signal})`);
+      return;
+    }
+    if (avatarAgentProcess !== child) {
+      return; // Superseded by a newer process; nothing to restart
+    }
+
     const uptime = avatarAgentStartTime > 0 ? Date.now() - avatarAgentStartTime : 0;
     if (code !== null) {
       log(`[Avatar Agent] Process exited with code ${code} (uptime: ${uptime}ms)`);
@@ -141,58 +191,97 @@ export function startAvatarAgent() {
   });
 }
 
+export function isAvatarAgentToken(token: string | undefined): boolean {
+  if (!token) return false;
+  const expected = Buffer.from(avatarAgentToken);
+  const received = Buffer.from(token);
+  return received.length === expected.length && crypto.timingSafeEqual(received, expected);
+}
+
+// Ask an agent to stop taking rooms and exit once its active rooms end. In start mode LiveKit
+// handles SIGTERM by marking the worker full and draining for up to AVATAR_DRAIN_TIMEOUT; a
+// second SIGTERM forces it out. Dev mode skips the drain and exits straight away.
+function drainAvatarAgent(child: ChildProcess) {
+  drainingAgents.add(child);
+  if (avatarAgentProcess === child) {
+    avatarAgentProcess = null;
+  }
+  try {
+    child.kill("SIGTERM");
+  } catch (error) {
+    // Process might already be dead
+  }
+  log(`[Avatar Agent] Draining process ${child.pid} (up to ${AVATAR_AGENT_DRAIN_TIMEOUT_MS / 1000}s for active rooms)`);
+
+  // The agent exits by itself at its deadline; this only catches a drain that hangs
+  setTimeout(() => {
+    if (drainingAgents.has(child)) {
+      log(`[Avatar Agent] Drain of process ${child.pid} overran, killing`);
+      child.kill("SIGKILL");
+    }
+  }, AVATAR_AGENT_DRAIN_TIMEOUT_MS + 30000).unref();
+}
+
+// Kill agent processes this server doesn't manage (stale PIDs, manual starts), sparing draining ones
+function killUnmanagedAgents(): number {
+  const drainingPids = new Set(Array.from(drainingAgents, (child) => child.pid));
+  let killed = 0;
+  try {
+    const result = execSync("pgrep -f 'python.*agent\\.py' 2>/dev/null || true", {
+      encoding: "utf-8",
+      timeout: 5000,
+    }).trim();
+    for (const pid of result.split("\n").map((p) => parseInt(p, 10))) {
+      if (!pid || drainingPids.has(pid)) continue;
+      try {
+        process.kill(pid);
+        killed++;
+      } catch (error) {
+        // Already gone
+      }
+    }
+  } catch (error) {
+    // pgrep failed - nothing we can do
+  }
+  return killed;
+}
+
 export function stopAvatarAgent(): boolean {
   if (avatarAgentProcess) {
     avatarAgentIntentionalStop = true;
-    avatarAgentProcess.kill();
-    log("[Avatar Agent] Stopping agent...");
+    drainAvatarAgent(avatarAgentProcess);
+    log("[Avatar Agent] Stopping agent (active rooms are allowed to finish)...");
     return true;
   }
   return false;
 }
 
 export function restartAvatarAgent(): { success: boolean; message: string } {
-  avatarAgentIntentionalStop = true;
-
-  // Clear our managed process reference
-  if (avatarAgentProcess) {
-    try {
-      avatarAgentProcess.kill();
-    } catch (error) {
-      // Process might already be dead
-    }
-    avatarAgentProcess = null;
+  // Rolling restart: the current agent drains its live conversations while the
+  // new one registers and takes every new room, so nothing in flight is cut off
+  const previous = avatarAgentProcess;
+  if (previous) {
+    drainAvatarAgent(previous);
   }
 
-  // Kill ALL running avatar agent processes (handles multiple instances, stale PIDs, etc.)
-  let killedCount = 0;
-  try {
-    const result = execSync("pkill -f 'python.*agent\\.py' 2>/dev/null; echo $?", {
-      encoding: "utf-8",
-      timeout: 5000,
-    });
-    // pkill returns 0 if processes were killed, 1 if none found
-    if (result.trim() === "0") {
-      killedCount = 1; // At least one was killed
-    }
-    log(`[Avatar Agent] Killed all existing avatar agent processes`);
-  } catch (error) {
-    // pkill failed or no processes found - that's fine
-    log(`[Avatar Agent] No existing processes to kill (or pkill failed)`);
+  // Kill any other avatar agent processes (multiple instances, stale PIDs, etc.)
+  const killedCount = killUnmanagedAgents();
+  if (killedCount > 0) {
+    log(`[Avatar Agent] Killed ${killedCount} unmanaged avatar agent process(es)`);
   }
 
-  // Wait a moment for processes to fully terminate, then start fresh
+  // Killed processes get a moment to terminate; a draining one keeps running alongside
   setTimeout(() => {
     avatarAgentIntentionalStop = false;
     avatarAgentRestartCount = 0;
     avatarAgentDisabled = false;
     avatarAgentDisabledReason = null;
     startAvatarAgent();
-  }, 1500);
+  }, killedCount > 0 ? 1500 : 0);
 
   return {
     success: true,
-    message: killedCount > 0
+    message: previous || killedCount > 0
       ? "Avatar agent is restarting..."
       : "Starting avatar agent..."
   };
@@ -201,6 +290,7 @@ export function restartAvatarAgent(): { success: boolean; message: string } {
 export function getAvatarAgentStatus(): {
   running: boolean;
   pid: number | null;
+  draining: number;
   restartCount: number;
   managedByServer: boolean;
   disabled: boolean;
@@ -211,6 +301,7 @@ export function getAvatarAgentStatus(): {
     return {
       running: true,
       pid: avatarAgentProcess.pid || null,
+      draining: drainingAgents.size,
       restartCount: avatarAgentRestartCount,
       managedByServer: true,
       disabled: avatarAgentDisabled,
@@ -231,6 +322,7 @@ export function getAvatarAgentStatus(): {
         return {
           running: true,
           pid: parseInt(pids[0], 10),
+          draining: drainingAgents.size,
           restartCount: avatarAgentRestartCount,
           managedByServer: false,
           disabled: avatarAgentDisabled,
@@ -245,6 +337,7 @@ export function getAvatarAgentStatus(): {
   return {
     running: false,
     pid: null,
+    draining: drainingAgents.size,
     restartCount: avatarAgentRestartCount,
     managedByServer: false,
     disabled: avatarAgentDisabled,
@@ -256,4 +349,5 @@ export function killAvatarAgentOnShutdown(): void {
   if (avatarAgentProcess) {
     avatarAgentProcess.kill();
   }
+  drainingAgents.forEach((child) => child.kill());
 }